@@ -0,0 +1,105 @@
+import hashlib
+import os
+from threading import Lock
+from PIL import Image
+from cache import LRUCache
+from timing import span
+
+# Enough for the full size sign background plus every icon at a few sizes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _image_bytes(img):
+    return img.width * img.height * len(img.getbands())
+
+
+class AssetCache(object):
+    """
+    Decodes and resamples each (path, size, mode) asset once per process.
+
+    If `disk_dir` is set, the derived bitmaps are also written there as raw pixel
+    dumps so the next run can skip the decode + resize too. Entries on disk
+    remember the source file's mtime and get rebuilt when the source changes.
+
+    Images handed out are shared between callers, so don't draw on them.
+    Paste them (or .copy() them first).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_dir=None):
+        self.memory = LRUCache(max_bytes, weigh=_image_bytes)
+        self.disk_dir = disk_dir
+        self.disk_hits = 0
+        self.disk_writes = 0
+        self._disk_lock = Lock()
+
+    def get(self, path, size, mode='RGB'):
+        size = (int(size[0]), int(size[1]))
+        return self.memory.get_or_create((path, size, mode), lambda: self._load(path, size, mode))
+
+    def _load(self, path, size, mode):
+        with span('load asset', 'asset', {'path': path, 'size': f'{size[0]}x{size[1]}'}):
+            return self._load_uncached(path, size, mode)
+
+    def _load_uncached(self, path, size, mode):
+        mtime = os.stat(path).st_mtime_ns
+        cached_path = None
+        if self.disk_dir:
+            cached_path = self._disk_path(path, size, mode)
+            img = self._read_disk(cached_path, mtime)
+            if img is not None:
+                self.disk_hits += 1
+                return img
+
+        # Resize in the source mode, then convert. That's what paste() used to do
+        # implicitly, and it keeps palette images on nearest neighbour resampling.
+        with Image.open(path) as src:
+            img = src.resize(size)
+        if mode is not None and img.mode != mode:
+            img = img.convert(mode)
+
+        if cached_path:
+            self._write_disk(cached_path, img, mtime)
+        return img
+
+    def _disk_path(self, path, size, mode):
+        key = f'{os.path.abspath(path)}|{size[0]}x{size[1]}|{mode}'
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f'{digest}.raw')
+
+    def _read_disk(self, cached_path, mtime):
+        try:
+            with open(cached_path, 'rb') as f:
+                header = f.readline().decode('ascii').split()
+                img_mode, width, height, source_mtime = header[0], int(header[1]), int(header[2]), int(header[3])
+                if source_mtime != mtime:
+                    return None
+                return Image.frombytes(img_mode, (width, height), f.read())
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _write_disk(self, cached_path, img, mtime):
+        with self._disk_lock:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp_path = f'{cached_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(f'{img.mode} {img.width} {img.height} {mtime}\n'.encode('ascii'))
+                f.write(img.tobytes())
+            os.replace(tmp_path, cached_path)
+            self.disk_writes += 1
+
+    def stats(self):
+        return dict(self.memory.stats(), disk_hits=self.disk_hits, disk_writes=self.disk_writes)
+
+    def clear(self):
+        self.memory.clear()
+
+
+cache = AssetCache()
+
+
+def get_asset(path, size, mode='RGB'):
+    return cache.get(path, size, mode)
+
+
+def use_disk_cache(disk_dir):
+    cache.disk_dir = disk_dir
@@ -0,0 +1,226 @@
+"""
+Benchmarks the render pipeline one stage at a time against the checked-in sheets.
+
+    python3 bench.py run --output bench_results.json
+    python3 bench.py compare bench_baseline.json bench_results.json
+
+Stages run in pipeline order and every repeat starts with all the caches emptied,
+so each stage sees what a fresh `main.py` run would: cold fonts in `fonts`, cold
+fits in `fit` (sign names, piece headers and piece names), then the raster stages
+with fits warm. `encode` is the time spent
+compressing the rasterized pieces and signs (to memory, nothing is written).
+"""
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+from io import BytesIO
+from time import perf_counter
+
+import PIL
+
+import assets
+import fonts
+import main
+import manifest
+import rules
+import textfit
+import tiles
+import writer
+from datastore import read_csv, read_art_csv, CAMPS_CSV, ART_CSV
+
+STAGES = ['parse', 'fonts', 'fit', 'piece_raster', 'sign_raster', 'encode']
+FONT_SIZES = [6, 10, 12, 20, 100, 450]
+# Fewer repeats than this and compare can't tell a slowdown from timer noise
+MIN_REPEAT = 3
+
+
+class StageTimer(object):
+    "Adds up perf_counter time per stage for one repeat."
+
+    def __init__(self):
+        self.seconds = {}
+        self.items = {}
+
+    def time(self, stage, fn, *args):
+        start = perf_counter()
+        value = fn(*args)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + perf_counter() - start
+        return value
+
+    def count(self, stage, n=1):
+        self.items[stage] = self.items.get(stage, 0) + n
+
+
+def reset_caches():
+    fonts.registry.clear()
+    assets.cache.clear()
+    tiles.cache.clear()
+    textfit.clear()
+    main.get_sign_template.cache_clear()
+    rules.clear()
+
+
+def encode(img, fmt):
+    out = BytesIO()
+    img.save(out, **fmt.save_options)
+    return out.tell()
+
+
+def run_once(args, fmt):
+    timer = StageTimer()
+    reset_caches()
+
+    camps = timer.time('parse', read_csv, args.camps_csv)
+    arts = timer.time('parse', read_art_csv, args.art_csv)
+    timer.count('parse', len(camps) + len(arts))
+    pieces = [camp for camp in camps if not camp.is_tiny()]
+    if args.limit:
+        pieces, camps, arts = pieces[:args.limit], camps[:args.limit], arts[:args.limit]
+
+    for font in (main.DEFAULT_FONT, main.FANCY_FONT, main.HARLEQUIN_FONT):
+        for size in FONT_SIZES:
+            timer.time('fonts', fonts.get_font, font, size)
+            timer.count('fonts')
+
+    for thing in camps + arts:
+        timer.time('fit', main.get_sign_font_size, thing)
+        timer.count('fit')
+    for camp in pieces:
+        timer.time('fit', main.get_piece_font_sizes, camp)
+        timer.count('fit')
+
+    for camp in pieces:
+        img = timer.time('piece_raster', main.gen_image_for_camp, camp)
+        timer.count('piece_raster')
+        timer.time('encode', encode, img, fmt)
+        timer.count('encode')
+
+    for gen, things in ((main.gen_sign_for_camp, camps), (main.gen_sign_for_art, arts)):
+        for thing in things:
+            img = timer.time('sign_raster', gen, thing)
+            timer.count('sign_raster')
+            timer.time('encode', encode, img, fmt)
+            timer.count('encode')
+
+    return timer
+
+
+def summarize(runs):
+    return {
+        'best': min(runs),
+        'median': statistics.median(runs),
+        'runs': runs,
+    }
+
+
+def spread(stage_results):
+    "How far apart the repeats of a stage landed, the noise a change has to beat."
+    return max(stage_results['runs']) - min(stage_results['runs'])
+
+
+def run(args):
+    fmt = writer.output_format(args.format, args.quality)
+    timers = []
+    for i in range(args.repeat):
+        timer = run_once(args, fmt)
+        print(f'repeat {i + 1}/{args.repeat}: ' + ', '.join(f'{stage} {timer.seconds.get(stage, 0):.3f}s' for stage in STAGES))
+        timers.append(timer)
+
+    results = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pillow': PIL.__version__,
+        'machine': platform.machine(),
+        'repeat': args.repeat,
+        'limit': args.limit,
+        'format': args.format,
+        'quality': args.quality,
+        # So compare can tell when the two runs weren't looking at the same sheets
+        'inputs': {path: manifest.file_digest(path) for path in (args.camps_csv, args.art_csv)},
+        'stages': {},
+    }
+    for stage in STAGES:
+        stage_results = summarize([timer.seconds.get(stage, 0.0) for timer in timers])
+        stage_results['items'] = timers[0].items.get(stage, 0)
+        results['stages'][stage] = stage_results
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Wrote {args.output}')
+    return 0
+
+
+def compare(args):
+    """
+    Compares the best time of every stage. A stage regressed if it got more than
+    `threshold` slower, and by more than both `min_delta` seconds and the spread of
+    its repeats in either run, so stages don't flap on timer noise. Exits 1 if
+    anything regressed, 2 if either run has too few repeats to judge.
+    """
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    for name, results in (('baseline', baseline), ('current', current)):
+        if results.get('repeat', 1) < args.min_repeat:
+            print(f'The {name} run only has {results.get("repeat", 1)} repeat(s), that is all noise. '
+                  f'Run it again with --repeat {args.min_repeat} or more (or lower --min-repeat)')
+            return 2
+
+    for key in ('inputs', 'limit', 'format', 'quality'):
+        if baseline.get(key) != current.get(key):
+            print(f'warning: {key} differs between the runs, the comparison may not mean much')
+
+    regressions = 0
+    print(f'{"stage":<14}{"baseline":>10}{"current":>10}{"change":>9}{"noise":>9}')
+    for stage in STAGES:
+        if stage not in baseline['stages'] or stage not in current['stages']:
+            continue
+        before = baseline['stages'][stage][args.statistic]
+        after = current['stages'][stage][args.statistic]
+        change = (after - before) / before if before else 0.0
+        noise = max(spread(baseline['stages'][stage]), spread(current['stages'][stage]))
+        floor = max(args.min_delta, noise)
+        flag = ''
+        if change > args.threshold and after - before > floor:
+            flag = '  REGRESSION'
+            regressions += 1
+        elif change < -args.threshold and before - after > floor:
+            flag = '  faster'
+        print(f'{stage:<14}{before:>9.3f}s{after:>9.3f}s{change:>+8.1%}{noise:>8.3f}s{flag}')
+
+    if regressions:
+        print(f'{regressions} stage(s) regressed by more than {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='bench', description='Times each stage of the render pipeline')
+    subparsers = parser.add_subparsers(required=True, dest='subcommand')
+
+    parser_run = subparsers.add_parser('run', help='Run the benchmarks and save the results as JSON')
+    parser_run.add_argument('--output', '-o', default='bench_results.json')
+    parser_run.add_argument('--repeat', type=int, default=3, help='Times to run every stage (default 3)')
+    parser_run.add_argument('--limit', type=int, default=0, metavar='N',
+                            help='Only use the first N camps, pieces and art for a quicker run')
+    parser_run.add_argument('--camps-csv', default=CAMPS_CSV, metavar='PATH')
+    parser_run.add_argument('--art-csv', default=ART_CSV, metavar='PATH')
+    parser_run.add_argument('--format', choices=writer.FORMAT_NAMES, default='jpeg')
+    parser_run.add_argument('--quality', type=int, default=100)
+
+    parser_compare = subparsers.add_parser('compare', help='Flag stages that got slower than a saved baseline')
+    parser_compare.add_argument('baseline')
+    parser_compare.add_argument('current')
+    parser_compare.add_argument('--threshold', type=float, default=0.10, help='Fractional slowdown that counts as a regression (default 0.10)')
+    parser_compare.add_argument('--min-delta', type=float, default=0.005, metavar='SECONDS',
+                                help='Ignore changes smaller than this many seconds (default 0.005)')
+    parser_compare.add_argument('--statistic', choices=['best', 'median'], default='best')
+    parser_compare.add_argument('--min-repeat', type=int, default=MIN_REPEAT, metavar='N',
+                                help=f'Refuse to compare runs with fewer repeats than this (default {MIN_REPEAT})')
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.subcommand == 'run' else compare(args))
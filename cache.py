@@ -0,0 +1,79 @@
+from collections import OrderedDict
+from threading import RLock
+
+
+class LRUCache(object):
+    """
+    A bounded mapping that evicts the least recently used entries first.
+
+    By default every entry counts as 1 towards `maxsize`. Pass `weigh` to bound
+    the cache by something else instead (e.g. bytes of pixel data).
+    """
+
+    def __init__(self, maxsize=128, weigh=None):
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        weight = self.weigh(value) if self.weigh else 1
+        with self._lock:
+            if key in self._data:
+                self.size -= self._data.pop(key)[1]
+            self._data[key] = (value, weight)
+            self.size += weight
+            # Always keep the newest entry, even if it alone is over the limit.
+            while self.size > self.maxsize and len(self._data) > 1:
+                _, (_, evicted_weight) = self._data.popitem(last=False)
+                self.size -= evicted_weight
+                self.evictions += 1
+        return value
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key)
+                return self._data[key][0]
+            self.misses += 1
+            return self.put(key, factory())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._data),
+            'size': self.size,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def __repr__(self):
+        s = self.stats()
+        return f'<LRUCache {s["entries"]} entries, {s["hits"]} hits / {s["misses"]} misses>'
@@ -1,7 +1,13 @@
 from pprint import pprint
 import csv
-from typing import List
-from enum import Enum
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple, Union
+from contextlib import contextmanager
+from enum import Enum, Flag, auto
+import itertools
+import os
+import sys
+import rules
+import workbook
 
 def bool_fetcher(row):
     def bool_is_set(key):
@@ -20,6 +26,13 @@ class SoundZone(Enum):
     SZ_3 = 'SZ 3'
     NA   = '#N/A'
 
+    @classmethod
+    def from_string(cls, s: str) -> 'SoundZone':
+        try:
+            return SoundZone(s.strip())
+        except ValueError:
+            return SoundZone.NA
+
 class CampType(Enum):
     WORK_SUPPORT = 'Work Support Camp'
     ART_SUPPORT = 'Art Support Camp'
@@ -33,17 +46,44 @@ class CampType(Enum):
             return CampType.ART_SUPPORT
         return CampType.THEME_CAMP
 
-#  TODO: Deal with time sections getting smashed together
-class InteractivityTime(Enum):
-    ART_SUPPORT = 'Art Support Camp'
-    WORK_SUPPORT = 'Work Support Camp'
-    MORNING = 'Morning'
-    AFTERNOON = 'Afternoon'
-    LATE_AFTERNOON = 'Late Afternoon'
-    EVENING = 'Evening'
-    LATE_NIGHT = 'Late Night'
-    EMPTY = ''
-    # TODO: Blank string?
+class InteractivityTime(Flag):
+    EMPTY = 0
+    ART_SUPPORT = auto()
+    WORK_SUPPORT = auto()
+    MORNING = auto()
+    AFTERNOON = auto()
+    LATE_AFTERNOON = auto()
+    EVENING = auto()
+    LATE_NIGHT = auto()
+
+    @classmethod
+    def from_string(cls, s: str) -> 'InteractivityTime':
+        """
+        The sheet smashes the time sections together with no separator, e.g.
+        'AfternoonLate Afternoon' or 'MorningEvening'. Pick every label out of it.
+        """
+        flags = InteractivityTime.EMPTY
+        i = 0
+        while i < len(s):
+            for label, flag in INTERACTIVITY_TIME_LABELS:
+                if s.startswith(label, i):
+                    flags |= flag
+                    i += len(label)
+                    break
+            else:
+                i += 1
+        return flags
+
+# Longest first, so 'Late Afternoon' doesn't get read as 'Afternoon'
+INTERACTIVITY_TIME_LABELS = [
+    ('Work Support Camp', InteractivityTime.WORK_SUPPORT),
+    ('Art Support Camp', InteractivityTime.ART_SUPPORT),
+    ('Late Afternoon', InteractivityTime.LATE_AFTERNOON),
+    ('Late Night', InteractivityTime.LATE_NIGHT),
+    ('Afternoon', InteractivityTime.AFTERNOON),
+    ('Morning', InteractivityTime.MORNING),
+    ('Evening', InteractivityTime.EVENING),
+]
 
 class SoundSize(Enum):
     SMALL = 1
@@ -87,55 +127,95 @@ class Food(Enum):
             return Food.FOOD_PLUS
         return Food.NONE
 
+# Codes used in the neighborhood preference column
+NEIGHBORHOODS = {
+    'FE': 'Forest Entry',
+    'MF': 'Main Field',
+    'NP': 'North Point Forest',
+    'RS': 'Riverside',
+    'MZ': 'Mezzanine',
+    'LB': 'Lower Bowl',
+    'UB': 'Upper Bowl',
+    'MD': 'The Meadow',
+}
+
 class SoundZoneHardPreference(Enum):
     YES = 'We would prefer not to be placed.'
     NO = 'We will make it work!'
     NONE = 'N/A'
 
 class Placeable(object):
+    """
+    A row from one of the sheets. Records are slotted and immutable, and hash their
+    fields once up front, so they're cheap to keep lots of, to use as cache keys and
+    to send to worker processes. Subclasses list their fields in FIELDS, in the same
+    order as their __init__ arguments.
+    """
+    __slots__ = ('_hash',)
+    FIELDS = ()
+    # Section of rules.json with this kind of row's sign names
+    SIGN_NAME_RULES = 'camp_sign_names'
+
+    def _freeze(self, *values):
+        for field, value in zip(self.FIELDS, values):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, '_hash', hash((type(self).__name__,) + values))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable, use replace()')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def values(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._hash == other._hash and self.values() == other.values()
+
+    def __reduce__(self):
+        return (type(self), self.values())
+
+    def replace(self, **changes):
+        "A copy of this record with some fields changed."
+        return type(self)(**dict(self.fields(), **changes))
+
     def get_name(self):
-        if not hasattr(self, 'name'):
-            raise NotImplemented("Fill this out")
-        if 'conch' in self.name.lower():
-            return 'Community Conch Art Support Camp'
-        elif 'disco tango foxtrot' in self.name.lower():
-            return 'Disco Tango Foxtrot \n DTF'
-        elif 'glowbal' in self.name.lower():
-            return 'Glowdeo Drive'
-        return self.name
+        "The name to print on the sign, after any override in rules.json."
+        return rules.get_rules().name(self.SIGN_NAME_RULES, self.name)
     
-    def to_filename(self, directory, suffix=""):
-        return f'{directory}/{self.name.replace(" ", "_").replace('/', '').lower()}{suffix}.jpg'
+    def fields(self):
+        "Everything parsed from the sheet for this row, e.g. for fingerprinting."
+        return dict(zip(self.FIELDS, self.values()))
+
+    def to_filename(self, directory, suffix="", extension="jpg"):
+        slug = self.name.replace(" ", "_").replace("/", "").lower()
+        return f'{directory}/{slug}{suffix}.{extension}'
 
 class CampInfo(Placeable):
+    FIELDS = (
+        'width', 'height', 'name', 'camp_type', 'sound_zone', 'interactivity_time', 'sound_size',
+        'sound_zone_hard_preference', 'neighborhood_preference', 'coffee', 'tea', 'food', 'fire',
+        'fire_circle', 'kids', 'bar', 'ada', 'xxx', 'trees', 'uneven_ground', 'rv_count',
+    )
+    __slots__ = FIELDS
+
     def __init__(
             self, width: int, height: int, name: str, camp_type: CampType,
             sound_zone: SoundZone, interactivity_time: InteractivityTime,
-            sound_size: SoundSize, sound_zone_hard_preference: bool, neighborhood_preference: List[str],
+            sound_size: SoundSize, sound_zone_hard_preference: SoundZoneHardPreference, neighborhood_preference: Tuple[str, ...],
             coffee: bool, tea: bool, food: Food, fire: bool, fire_circle: bool, kids: Kids,
             bar: bool, ada: bool, xxx: bool, trees: bool, uneven_ground: bool,
             rv_count: int):
-        self.width = width
-        self.height = height
-        self.name = name
-        self.camp_type = camp_type
-        self.sound_zone = sound_zone
-        self.sound_zone_hard_preference = sound_zone_hard_preference
-        self.interactivity_time = interactivity_time
-        self.sound_size = sound_size
-        self.neighborhood_preference = neighborhood_preference
-        self.coffee = coffee
-        self.tea = tea
-        self.food = food
-        self.fire = fire
-        self.fire_circle = fire_circle
-        self.kids = kids
-        self.bar = bar
-        self.ada = ada
-        self.xxx = xxx
-        self.trees = trees
-        self.uneven_ground = uneven_ground
-        self.rv_count = rv_count
+        self._freeze(
+            width, height, name, camp_type, sound_zone, interactivity_time, sound_size,
+            sound_zone_hard_preference, tuple(neighborhood_preference), coffee, tea, food, fire,
+            fire_circle, kids, bar, ada, xxx, trees, uneven_ground, rv_count)
 
     def __repr__(self):
         return f'<CampInfo: {self.name} {self.width}x{self.height}>'
@@ -144,63 +224,177 @@ class CampInfo(Placeable):
         return self.height < 20 or self.width < 20
 
 class ArtInfo(Placeable): 
+    FIELDS = ('name', 'number')
+    __slots__ = FIELDS
+    SIGN_NAME_RULES = 'art_sign_names'
+
     def __init__(
         self, name: str, number: str
         ):
-        self.name = name
-        self.number = number
+        self._freeze(name, number)
 
     def __repr__(self):
         return f'<ArtInfo: {self.name}>'
 
-    def get_name(self):
-        if "conch" in self.name.lower():
-            # @@@
-            return "Community Conch"
-        return self.name
-
-def read_csv():
-    with open('./placement-temp.csv') as f:
-        reader = csv.DictReader(f)
-        camps = []
-        for row in reader:
-            bool_get = bool_fetcher(row)
-
-            try:
-                rv_count = int(row['RVs'])
-            except ValueError:
-                rv_count = 0
-            camp_type = row['Camp Type']  # e.g.  "Theme Camp"
-            interactivity_time = row['Interactivity Time/Name Highlight Color']
-            sound_size = row['Sound'] # how big their soundsystem is: small, medium, nothing
-            sound_zone_hard_preference = row['Make SZ work? Data']
-            sound_zone = row['Sound Zone'] # e.g. "SZ 2"
-            kids = row['Kids v Kids+'] # Kids, Kids+
-            food = row['Food'] # Food, Food+
-
-            camps.append(CampInfo(
-                width=int(row['Frontage']),
-                height=int(row['Depth']),
-                name=row[' '],
-                camp_type=camp_type, sound_zone=sound_zone, sound_zone_hard_preference=SoundZoneHardPreference(sound_zone_hard_preference), interactivity_time=interactivity_time, sound_size=SoundSize.from_string(sound_size),
-                neighborhood_preference=row['neighborhood'].strip().split(' '),
-                coffee=bool_get('Coffee'),tea=bool_get('Tea'),fire=bool_get('Fire'), fire_circle=bool_get('Fire Circle'),
-                food=Food.from_string(food),
-                kids=Kids.from_string(kids),
-                bar=bool_get('Bar'), ada=bool_get('ADA'), xxx=bool_get('XXX'),
-                uneven_ground=bool_get('Uneven Ground Data'), trees=bool_get('Trees'),
-                rv_count=rv_count
-            ))
-    return camps
-
-
-def read_art_csv(): 
-    with open('./placement-art.csv') as f:
-        reader = csv.DictReader(f)
-        arts = []
-        for row in reader:
-            arts.append(ArtInfo(
-                name=row['Art Name'],
-                number=row['Number']
-            ))
-    return arts
+CAMPS_CSV = './placement-temp.csv'
+ART_CSV = './placement-art.csv'
+
+# The only columns we read out of the (very wide) placement export
+CAMP_COLUMNS = [
+    ' ', 'Frontage', 'Depth', 'RVs', 'Camp Type', 'Interactivity Time/Name Highlight Color',
+    'Sound', 'Make SZ work? Data', 'Sound Zone', 'Kids v Kids+', 'Food', 'neighborhood',
+    'Coffee', 'Tea', 'Fire', 'Fire Circle', 'Bar', 'ADA', 'XXX', 'Uneven Ground Data', 'Trees',
+]
+ART_COLUMNS = ['Art Name', 'Number']
+
+def resolve_columns(header: List[str], wanted: List[str]) -> Dict[str, int]:
+    """
+    Maps each wanted heading to a column index. The sheet repeats a lot of headings
+    (Trees, ADA, Fire, Frontage, ...); the LAST column with a heading wins, which is
+    what csv.DictReader did before.
+    """
+    indices = {}
+    for i, heading in enumerate(header):
+        if heading in wanted:
+            indices[heading] = i
+    missing = [heading for heading in wanted if heading not in indices]
+    if missing:
+        raise KeyError(f'Sheet is missing columns: {missing}')
+    return indices
+
+class ProjectedRow(object):
+    "Read-only view of one row, looked up by heading through the resolved column indices."
+    __slots__ = ('values', 'indices')
+
+    def __init__(self, values: List[str], indices: Dict[str, int]):
+        self.values = values
+        self.indices = indices
+
+    def __getitem__(self, heading):
+        i = self.indices[heading]
+        # Trailing empty cells get dropped by some exporters
+        return self.values[i] if i < len(self.values) else ''
+
+def project_rows(rows: Iterable[List[str]], wanted: List[str]) -> Iterator[ProjectedRow]:
+    "Takes raw rows (header first) and yields a ProjectedRow for every data row."
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return
+    indices = resolve_columns(header, wanted)
+    for values in rows:
+        if not any(values):
+            continue
+        yield ProjectedRow(values, indices)
+
+@contextmanager
+def open_source(source: Union[str, TextIO]):
+    "Lets the readers take either a path or an already open text stream."
+    if isinstance(source, str):
+        with open(source, newline='') as f:
+            yield f
+    else:
+        yield source
+
+def camp_from_row(row) -> CampInfo:
+    bool_get = bool_fetcher(row)
+
+    try:
+        rv_count = int(row['RVs'])
+    except ValueError:
+        rv_count = 0
+    camp_type = row['Camp Type']  # e.g.  "Theme Camp"
+    interactivity_time = row['Interactivity Time/Name Highlight Color']
+    sound_size = row['Sound'] # how big their soundsystem is: small, medium, nothing
+    sound_zone_hard_preference = row['Make SZ work? Data']
+    sound_zone = row['Sound Zone'] # e.g. "SZ 2"
+    kids = row['Kids v Kids+'] # Kids, Kids+
+    food = row['Food'] # Food, Food+
+
+    return CampInfo(
+        width=int(row['Frontage']),
+        height=int(row['Depth']),
+        name=row[' '],
+        camp_type=CampType.from_string(camp_type), sound_zone=SoundZone.from_string(sound_zone), sound_zone_hard_preference=SoundZoneHardPreference(sound_zone_hard_preference), interactivity_time=InteractivityTime.from_string(interactivity_time), sound_size=SoundSize.from_string(sound_size),
+        neighborhood_preference=tuple(sys.intern(code) for code in row['neighborhood'].strip().split(' ')),
+        coffee=bool_get('Coffee'),tea=bool_get('Tea'),fire=bool_get('Fire'), fire_circle=bool_get('Fire Circle'),
+        food=Food.from_string(food),
+        kids=Kids.from_string(kids),
+        bar=bool_get('Bar'), ada=bool_get('ADA'), xxx=bool_get('XXX'),
+        uneven_ground=bool_get('Uneven Ground Data'), trees=bool_get('Trees'),
+        rv_count=rv_count
+    )
+
+def art_from_row(row) -> ArtInfo:
+    return ArtInfo(
+        name=row['Art Name'],
+        number=row['Number']
+    )
+
+def camps_from_rows(rows: Iterable[List[str]]) -> Iterator[CampInfo]:
+    for row in project_rows(rows, CAMP_COLUMNS):
+        yield camp_from_row(row)
+
+def arts_from_rows(rows: Iterable[List[str]]) -> Iterator[ArtInfo]:
+    for row in project_rows(rows, ART_COLUMNS):
+        yield art_from_row(row)
+
+class Workbook(object):
+    """
+    The camps and art out of one downloaded workbook (.xlsx or .ods), read in a
+    single pass. Tabs are recognized by their headings, not their names: the first
+    one with every camp column is the camps, the first with the art columns is the art.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.camps = None
+        self.arts = None
+        for name, rows in workbook.sheets(path):
+            header = next(rows, None)
+            if header is None:
+                continue
+            headings = set(header)
+            if self.camps is None and headings.issuperset(CAMP_COLUMNS):
+                self.camps = list(camps_from_rows(itertools.chain([header], rows)))
+            elif self.arts is None and headings.issuperset(ART_COLUMNS):
+                self.arts = list(arts_from_rows(itertools.chain([header], rows)))
+
+    def get(self, kind) -> list:
+        found = self.camps if kind == 'camps' else self.arts
+        if found is None:
+            label, columns = ('camp', CAMP_COLUMNS) if kind == 'camps' else ('art', ART_COLUMNS)
+            raise KeyError(f'No sheet in {self.path} has the {label} columns: {columns}')
+        return found
+
+_workbooks: Dict[Tuple[str, int, int], Workbook] = {}
+
+def load_workbook(path: str) -> Workbook:
+    "The parsed workbook, only read again once the file changes (so both tabs come from one read)."
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    if key not in _workbooks:
+        _workbooks.clear()
+        _workbooks[key] = Workbook(path)
+    return _workbooks[key]
+
+def iter_camps(source: Union[str, TextIO] = CAMPS_CSV) -> Iterator[CampInfo]:
+    "Streams CampInfos out of a placement export, one row at a time. Takes a workbook too."
+    if workbook.is_workbook(source):
+        yield from load_workbook(source).get('camps')
+        return
+    with open_source(source) as f:
+        yield from camps_from_rows(csv.reader(f))
+
+def iter_arts(source: Union[str, TextIO] = ART_CSV) -> Iterator[ArtInfo]:
+    if workbook.is_workbook(source):
+        yield from load_workbook(source).get('arts')
+        return
+    with open_source(source) as f:
+        yield from arts_from_rows(csv.reader(f))
+
+def read_csv(source: Union[str, TextIO] = CAMPS_CSV) -> List[CampInfo]:
+    return list(iter_camps(source))
+
+def read_art_csv(source: Union[str, TextIO] = ART_CSV) -> List[ArtInfo]:
+    return list(iter_arts(source))
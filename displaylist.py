@@ -0,0 +1,211 @@
+import math
+from typing import List, NamedTuple, Optional, Tuple, Union
+from PIL import Image, ImageDraw
+import assets
+import fonts
+import tiles
+
+
+# Everything in a display list is in design units: for map pieces that's pixels at
+# PIXELS_PER_FOOT (so a piece's layout is in feet, just pre-multiplied), for signs
+# it's pixels of the 3301x2551 sign. rasterize() turns a list into an image at any
+# scale of that; at scale 1 it draws exactly what the pieces and signs always were.
+
+class Label(NamedTuple):
+    "A filled box with text centered in it, clipped to the box."
+    text: str
+    x: int
+    y: int
+    width: int                  # before rotation
+    height: int
+    color: str
+    bg: str
+    font_path: str
+    size: int
+    align: str = 'left'
+    rotate: bool = False        # a quarter turn clockwise, so it covers height x width
+    repeats: bool = False       # the same label turns up on lots of items, worth caching as a tile
+
+
+class Picture(NamedTuple):
+    "An image file, resized to fill the box."
+    path: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class Ring(NamedTuple):
+    "A circle with a number in it, like the RV count."
+    number: int
+    x: int
+    y: int
+    diameter: int
+    line_width: int
+    color: str
+    bg: str
+    font_path: str
+    size: int
+
+
+Op = Union[Label, Picture, Ring]
+
+
+class DisplayList(object):
+    """
+    Where everything on one piece or sign goes, worked out once. Rasterizing it
+    again at another scale doesn't redo any of the layout (text fitting, bar placement).
+
+    `background_image`, if there is one, is stretched over the whole thing.
+    """
+
+    def __init__(self, width: int, height: int, background='#FFFFFF', background_image: Optional[str] = None):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.background_image = background_image
+        self.ops: List[Op] = []
+
+    def add(self, op: Op):
+        self.ops.append(op)
+
+    def __repr__(self):
+        return f'<DisplayList {self.width}x{self.height} {len(self.ops)} ops>'
+
+
+def draw_rectangle(img, draw, text, top_left, width, height, color, bg, font_path, size, align='left', rotate=False):
+    """
+    Draws a Label straight onto img: what pasting a separate width x height image
+    with the text centered in it used to do (turned with rotate(-90, expand=1) if rotate).
+
+    Text that fits its box is drawn in place. Text that spills over, and all rotated
+    text, is drawn into a mask just the size of the visible part of the text so it's
+    clipped to the box the way the separate image used to clip it.
+    """
+    if width <= 0 or height <= 0:
+        return
+    x, y = top_left
+    if rotate:
+        draw.rectangle((x, y, x + height - 1, y + width - 1), fill=bg)
+    else:
+        draw.rectangle((x, y, x + width - 1, y + height - 1), fill=bg)
+    if not text:
+        return
+
+    font = fonts.get_font(font_path, size)
+    bbox = draw.multiline_textbbox((width/2, height/2), text, font=font, anchor='mm', align=align)
+    l, t = max(math.floor(bbox[0]), 0), max(math.floor(bbox[1]), 0)
+    r, b = min(math.ceil(bbox[2]), width), min(math.ceil(bbox[3]), height)
+    if l >= r or t >= b:
+        return
+    if not rotate and (l, t, r, b) == (bbox[0], bbox[1], bbox[2], bbox[3]):
+        draw.multiline_text((x + width/2, y + height/2), text, fill=color, font=font, anchor='mm', align=align)
+        return
+
+    mask = Image.new('L', (r - l, b - t), 0)
+    ImageDraw.Draw(mask).multiline_text((width/2 - l, height/2 - t), text, fill=255, font=font, anchor='mm', align=align)
+    if rotate:
+        # Turning the box a quarter clockwise puts the text's (l, t, r, b) at (height - b, l) within it
+        img.paste(color, (x + height - b, y + l), mask.transpose(Image.Transpose.ROTATE_270))
+    else:
+        img.paste(color, (x + l, y + t), mask)
+
+
+def draw_label(img, label: Label):
+    """
+    draw_rectangle for labels that repeat from item to item: each distinct one is
+    drawn (and rotated) once into a tile, then pasted.
+    """
+    if label.width <= 0 or label.height <= 0:
+        return
+    key = (label.text, label.color, label.bg, label.size, label.font_path, label.align,
+           label.width, label.height, label.rotate)
+
+    def render():
+        tile = Image.new("RGB", (label.height, label.width) if label.rotate else (label.width, label.height))
+        draw_rectangle(tile, ImageDraw.Draw(tile), label.text, (0, 0), label.width, label.height, label.color,
+                       label.bg, label.font_path, label.size, label.align, label.rotate)
+        return tile
+
+    img.paste(tiles.get_tile(key, render), (label.x, label.y))
+
+
+def ring_image(ring: Ring):
+    # TODO FIGURE OUT TRANSPARENT BG
+    i = Image.new("RGB", (ring.diameter, ring.diameter), ring.bg)
+    drawer = ImageDraw.Draw(i)
+
+    tl = math.floor((ring.diameter - ring.size) / 2)
+    drawer.arc((0,0, ring.diameter, ring.diameter), 0, 360, fill=ring.color, width=ring.line_width)
+    drawer.text((tl, tl), str(ring.number), fill=ring.color, font=fonts.get_font(ring.font_path, ring.size))
+
+    return i
+
+
+def _edge(value, scale):
+    # Scale both edges of a box and take the difference, so boxes that touched still touch.
+    return math.floor(value * scale + 0.5)
+
+
+def _span(start, length, scale):
+    first = _edge(start, scale)
+    return first, _edge(start + length, scale) - first
+
+
+def scale_op(op: Op, sx: float, sy: float) -> Op:
+    font_scale = min(sx, sy)
+    if isinstance(op, Label):
+        across, down = (op.height, op.width) if op.rotate else (op.width, op.height)
+        x, across = _span(op.x, across, sx)
+        y, down = _span(op.y, down, sy)
+        width, height = (down, across) if op.rotate else (across, down)
+        return op._replace(x=x, y=y, width=width, height=height, size=max(1, round(op.size * font_scale)))
+    if isinstance(op, Picture):
+        x, width = _span(op.x, op.width, sx)
+        y, height = _span(op.y, op.height, sy)
+        return op._replace(x=x, y=y, width=width, height=height)
+    if isinstance(op, Ring):
+        return op._replace(x=_edge(op.x, sx), y=_edge(op.y, sy), diameter=round(op.diameter * font_scale),
+                           line_width=max(1, round(op.line_width * font_scale)),
+                           size=max(1, round(op.size * font_scale)))
+    raise TypeError(f'Unknown display list op {op!r}')
+
+
+def size_at(display_list: DisplayList, scale: float) -> Tuple[int, int]:
+    return _edge(display_list.width, scale), _edge(display_list.height, scale)
+
+
+def rasterize(display_list: DisplayList, scale: float = 1.0, size: Optional[Tuple[int, int]] = None) -> Image.Image:
+    """
+    Draws the list `scale` times its design size, or stretched to exactly `size`
+    (e.g. to land on a page grid). Fonts are re-rendered at the new size, not resampled.
+    """
+    if size is None:
+        size = size_at(display_list, scale)
+    sx, sy = size[0] / display_list.width, size[1] / display_list.height
+    same_size = (sx, sy) == (1, 1)
+
+    if display_list.background_image:
+        # Shared cached image, so copy before drawing on it
+        img = assets.get_asset(display_list.background_image, size).copy()
+    else:
+        img = Image.new("RGB", size, display_list.background)
+    draw = ImageDraw.Draw(img)
+
+    for op in display_list.ops:
+        if not same_size:
+            op = scale_op(op, sx, sy)
+        if isinstance(op, Label):
+            if op.repeats:
+                draw_label(img, op)
+            else:
+                draw_rectangle(img, draw, op.text, (op.x, op.y), op.width, op.height, op.color, op.bg,
+                               op.font_path, op.size, op.align, op.rotate)
+        elif isinstance(op, Picture):
+            if op.width > 0 and op.height > 0:
+                img.paste(assets.get_asset(op.path, (op.width, op.height)), (op.x, op.y))
+        elif isinstance(op, Ring):
+            if op.diameter > 0:
+                img.paste(ring_image(op), (op.x, op.y))
+    return img
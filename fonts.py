@@ -0,0 +1,68 @@
+from io import BytesIO
+from threading import Lock
+from PIL import ImageFont
+from cache import LRUCache
+import glyphs
+from timing import span
+
+
+class FontRegistry(object):
+    """
+    Loads each font file from disk once and hands out sized variants of it.
+
+    ImageFont.truetype parses the whole TTF every time it's called, and we were
+    calling it for every rectangle on every piece and sign. The raw face bytes are
+    kept forever (there are only three fonts); the (font, size) variants live in
+    an LRU because piece font sizes are computed and can vary a lot.
+
+    Fonts passed to use_atlas() draw their text from the glyph atlas, see glyphs.py.
+    """
+
+    def __init__(self, maxsize=256):
+        self._faces = {}
+        self.atlas_fonts = set()
+        self._faces_lock = Lock()
+        self.variants = LRUCache(maxsize)
+
+    def face_bytes(self, font_path):
+        with self._faces_lock:
+            if font_path not in self._faces:
+                with span('read font', 'font', {'font': font_path}), open(font_path, 'rb') as f:
+                    self._faces[font_path] = f.read()
+            return self._faces[font_path]
+
+    def use_atlas(self, font_path):
+        self.atlas_fonts.add(font_path)
+
+    def get(self, font_path, size):
+        return self.variants.get_or_create(
+            (font_path, size),
+            lambda: self._load(font_path, size),
+        )
+
+    def _load(self, font_path, size):
+        face = self.face_bytes(font_path)
+        with span('load font', 'font', {'font': font_path, 'size': size}):
+            if font_path in self.atlas_fonts:
+                return glyphs.AtlasFont(BytesIO(face), size=size, name=font_path)
+            return ImageFont.truetype(font=BytesIO(face), size=size)
+
+    def stats(self):
+        return dict(self.variants.stats(), faces=len(self._faces))
+
+    def clear(self):
+        with self._faces_lock:
+            self._faces.clear()
+        self.variants.clear()
+        glyphs.atlas.clear()
+
+
+registry = FontRegistry()
+
+
+def use_atlas(font_path):
+    registry.use_atlas(font_path)
+
+
+def get_font(font_path, size):
+    return registry.get(font_path, size)
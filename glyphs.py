@@ -0,0 +1,205 @@
+"""
+A glyph atlas for the sign fonts. Pillow rasterizes every glyph of a line from
+scratch each time it draws it (twice, actually: once to find the line's extent and
+again to draw), and sign names are a few dozen letters set at 200-450pt over and
+over. AtlasFont renders each (font, size, character) once, keeps the bitmap, and
+builds a line's mask by pasting cached glyphs at the pen positions FreeType's
+advances and kerning give, the same way Pillow's basic layout places them, so the
+mask comes out byte for byte the same.
+
+That leans on Pillow internals: wrapping the core image getmask2 hands back, and
+where font_render puts the pen. The atlas only switches on for the Pillows it was
+checked against, and the first CHECK_LINES lines it draws are compared with stock
+getmask2's. If any differ, or an internal has moved, every AtlasFont falls back to stock for the
+rest of the process.
+"""
+import math
+from typing import NamedTuple, Optional
+from PIL import Image, ImageFont, ImageMath, __version__ as PILLOW_VERSION
+from cache import LRUCache
+
+# Glyphs at sign sizes are big (a 450pt capital is ~100KB), this holds a few thousand.
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+# Checked against 10.3 (what poetry.lock pins) up to 12.x. lambda_eval arrived in 10.3.
+TESTED_PILLOWS = ((10, 3), (13, 0))
+
+
+# How many lines to draw both ways before trusting the atlas
+CHECK_LINES = 16
+
+
+def _pillow_supported():
+    version = tuple(int(part) for part in PILLOW_VERSION.split('.')[:2])
+    return TESTED_PILLOWS[0] <= version < TESTED_PILLOWS[1] and hasattr(ImageMath, 'lambda_eval')
+
+
+def _pixel(x):
+    "26.6 fixed point to whole pixels, rounding the way FreeType's PIXEL() does."
+    return ((x + 32) & -64) >> 6
+
+
+class Glyph(NamedTuple):
+    bitmap: Optional[Image.Image]   # cropped to the ink, None for a space
+    x: int                          # where the bitmap goes relative to the pen, in pixels
+    y: int                          # ... and relative to the baseline, down
+    left: int                       # FreeType's bitmap_left and bitmap_top, for the line's extent
+    top: int
+
+
+def _glyph_bytes(glyph: Glyph):
+    return glyph.bitmap.width * glyph.bitmap.height if glyph.bitmap else 0
+
+
+class GlyphAtlas(object):
+    "Rendered glyphs keyed by (font, size, character), bounded by bytes of bitmap."
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.memory = LRUCache(max_bytes, weigh=_glyph_bytes)
+        self.enabled = _pillow_supported()
+        self.unchecked = CHECK_LINES
+
+    def get(self, key, render):
+        return self.memory.get_or_create(key, render)
+
+    def disable(self):
+        if self.enabled:
+            print(f'Glyph atlas does not match Pillow {PILLOW_VERSION}, drawing text the stock way')
+        self.enabled = False
+        self.memory.clear()
+
+    def stats(self):
+        return dict(self.memory.stats(), enabled=self.enabled)
+
+    def clear(self):
+        self.memory.clear()
+
+
+atlas = GlyphAtlas()
+
+
+def _blend(glyph, target):
+    "Pillow's glyph over glyph: t = g + t * (255 - g) / 255, with its rounding."
+    def over(a):
+        product = a['t'] * (255 - a['g']) + 128
+        return a['g'] + ((product + (product >> 8)) >> 8)
+    return ImageMath.lambda_eval(over, g=glyph, t=target).convert('L')
+
+
+def _wrap(core):
+    "An Image around the core image getmask2 returns, sharing its pixels."
+    image = Image.new('L', core.size)
+    image.im = core
+    return image
+
+
+class AtlasFont(ImageFont.FreeTypeFont):
+    """
+    A FreeTypeFont whose getmask2 draws from the glyph atlas. `name` is the font's
+    part of the atlas key (the font file's path).
+
+    Only plain 'L' text with the basic layout goes through the atlas. Strokes,
+    directions, features and Raqm's shaping all go to Pillow as before.
+    """
+
+    def __init__(self, font, size, name, **kwargs):
+        super().__init__(font, size, **kwargs)
+        self.name = name
+        self._advances = {}
+        self._kerns = {}
+
+    def _advance(self, char):
+        "In 26.6, kerning not included."
+        if char not in self._advances:
+            self._advances[char] = round(self.getlength(char, 'L') * 64)
+        return self._advances[char]
+
+    def _kern(self, a, b):
+        if (a, b) not in self._kerns:
+            self._kerns[(a, b)] = round(self.getlength(a + b, 'L') * 64) - self._advance(a) - self._advance(b)
+        return self._kerns[(a, b)]
+
+    def _render(self, char):
+        core, (ox, oy) = super().getmask2(char, 'L', anchor='ls')
+        bitmap = _wrap(core)
+        box = bitmap.getbbox()
+        if not box:
+            return Glyph(None, 0, 0, ox, -oy)
+        return Glyph(bitmap.crop(box), ox + box[0], oy + box[1], ox, -oy)
+
+    def glyph(self, char) -> Glyph:
+        return atlas.get((self.name, self.size, char), lambda: self._render(char))
+
+    def getmask2(self, text, mode='', direction=None, features=None, language=None, stroke_width=0,
+                 anchor=None, ink=0, start=None, *args, **kwargs):
+        # Newer Pillows pass these along from ImageDraw.text, neither matters here
+        kwargs.pop('stroke_filled', None)
+        kwargs.pop('font_size', None)
+        if (not atlas.enabled or mode != 'L' or direction or features or language or stroke_width or args
+                or kwargs or not isinstance(text, str) or self.layout_engine != ImageFont.Layout.BASIC):
+            return super().getmask2(text, mode, direction, features, language, stroke_width, anchor, ink, start,
+                                    *args, **kwargs)
+        if atlas.unchecked > 0:
+            return self._check(text, anchor, ink, start)
+        try:
+            return self._atlas_mask(text, anchor, start)
+        except (AttributeError, TypeError, ValueError):
+            atlas.disable()
+            return super().getmask2(text, mode, anchor=anchor, ink=ink, start=start)
+
+    def _check(self, text, anchor, ink, start):
+        "Draws the line both ways, gives up on the atlas if they disagree, and hands back stock's."
+        stock, stock_offset = super().getmask2(text, 'L', anchor=anchor, ink=ink, start=start)
+        try:
+            mask, offset = self._atlas_mask(text, anchor, start)
+            same = (offset == stock_offset and mask.size == stock.size
+                    and _wrap(mask).tobytes() == _wrap(stock).tobytes())
+        except (AttributeError, TypeError, ValueError):
+            same = False
+        if same:
+            atlas.unchecked -= 1
+        else:
+            atlas.disable()
+        return stock, stock_offset
+
+    def _atlas_mask(self, text, anchor, start):
+        start_x, start_y = start or (0, 0)
+        left, top, right, bottom = self.getbbox(text, 'L', anchor=anchor)
+        width, height = right - left, bottom - top
+        offset = (left, top)
+        mask = Image.new('L', (width + math.ceil(start_x), height + math.ceil(start_y)))
+        if not text or not mask.width or not mask.height:
+            return mask.im, offset
+
+        pens = []
+        pen = 0
+        for i, char in enumerate(text):
+            pens.append(pen)
+            pen += self._advance(char)
+            if i + 1 < len(text):
+                pen += self._kern(char, text[i + 1])
+        glyphs = [self.glyph(char) for char in text]
+
+        # Where Pillow puts the pen's origin in the mask, see font_render in _imagingft.c
+        x_min = min(0, min(_pixel(pen) + glyph.left for pen, glyph in zip(pens, glyphs)))
+        y_max = max(0, max(glyph.top for glyph in glyphs))
+        origin_x = round((-x_min + start_x) * 64)
+        origin_y = -_pixel(round((-y_max - start_y) * 64))
+
+        inked_right = None
+        for pen, glyph in zip(pens, glyphs):
+            if glyph.bitmap is None:
+                continue
+            x = _pixel(origin_x + pen) + glyph.x
+            y = origin_y + glyph.y
+            box = (x, y, x + glyph.bitmap.width, y + glyph.bitmap.height)
+            # Anything over the mask's edge gets clipped by the paste, like Pillow clips it.
+            # Glyphs that reach back over the one before (kerned pairs, swashes) blend into it.
+            under = mask.crop(box) if inked_right is not None and x < inked_right else None
+            if under is None or under.getbbox() is None:
+                mask.paste(glyph.bitmap, box)
+            else:
+                mask.paste(_blend(glyph.bitmap, under), box)
+            inked_right = box[2] if inked_right is None else max(inked_right, box[2])
+        return mask.im, offset
@@ -0,0 +1,124 @@
+import math
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from PIL import Image
+
+white = '#FFFFFF'
+
+# Paper sizes in inches (portrait)
+PAGE_SIZES = {
+    'letter': (8.5, 11),
+    'legal': (8.5, 14),
+    'tabloid': (11, 17),
+}
+
+
+class Placement(NamedTuple):
+    item: object
+    x: int
+    y: int
+    width: int          # on the page, i.e. already turned if rotated
+    height: int
+    rotated: bool = False
+
+
+class Page(NamedTuple):
+    number: int
+    placements: List[Placement]
+
+
+class _Shelf(object):
+    __slots__ = ('y', 'height', 'used')
+
+    def __init__(self, y, height):
+        self.y = y
+        self.height = height
+        self.used = 0
+
+
+def turned(width, height, page_width, page_height) -> Optional[bool]:
+    "False if a width x height piece fits the page as it is, True if it only fits turned a quarter, None if neither."
+    if width <= page_width and height <= page_height:
+        return False
+    if height <= page_width and width <= page_height:
+        return True
+    return None
+
+
+def pack(items: Sequence, size_of: Callable[[object], Tuple[int, int]], page_width: int, page_height: int,
+         gap: int = 0) -> List[Page]:
+    """
+    Shelf packs rectangles onto as few pages as it can (first fit, tallest first).
+    Pieces keep the camp's frontage at the top unless they only fit the page
+    turned a quarter, then they're placed rotated.
+
+    `page_width`/`page_height` are the printable area. Returns pages of placements
+    relative to the printable area's top left corner. Raises ValueError if any item
+    is bigger than a page either way round.
+    """
+    sized = []
+    for index, item in enumerate(items):
+        width, height = size_of(item)
+        rotated = turned(width, height, page_width, page_height)
+        if rotated is None:
+            raise ValueError(f'{item!r} is {width}x{height}px, bigger than a {page_width}x{page_height}px page')
+        if rotated:
+            width, height = height, width
+        sized.append((height, width, index, item, rotated))
+    # Tallest first; the original order breaks ties so the result is deterministic
+    sized.sort(key=lambda s: (-s[0], -s[1], s[2]))
+
+    pages: List[Page] = []
+    shelves: List[List[_Shelf]] = []  # per page
+    for height, width, _, item, rotated in sized:
+        placed = False
+        for page, page_shelves in zip(pages, shelves):
+            for shelf in page_shelves:
+                # Items come tallest first, so anything fits the height of an existing shelf
+                if shelf.used + width <= page_width:
+                    page.placements.append(Placement(item, shelf.used, shelf.y, width, height, rotated))
+                    shelf.used += width + gap
+                    placed = True
+                    break
+            if placed:
+                break
+            bottom = page_shelves[-1].y + page_shelves[-1].height + gap
+            if bottom + height <= page_height:
+                shelf = _Shelf(bottom, height)
+                page_shelves.append(shelf)
+                page.placements.append(Placement(item, 0, shelf.y, width, height, rotated))
+                shelf.used = width + gap
+                placed = True
+                break
+        if not placed:
+            shelf = _Shelf(0, height)
+            shelf.used = width + gap
+            pages.append(Page(len(pages) + 1, [Placement(item, 0, 0, width, height, rotated)]))
+            shelves.append([shelf])
+    return pages
+
+
+def page_pixels(page_size: Tuple[float, float], dpi: int, margin: float):
+    "Full page size and printable area in pixels for a page size in inches."
+    width, height = (math.floor(inches * dpi) for inches in page_size)
+    margin_px = math.floor(margin * dpi)
+    return (width, height), (width - 2 * margin_px, height - 2 * margin_px), margin_px
+
+
+def render_pages(pages: Sequence[Page], render: Callable[[object, Tuple[int, int]], Image.Image],
+                 page_size_px: Tuple[int, int], margin_px: int) -> Iterator[Tuple[Page, Image.Image]]:
+    """
+    Yields (page, image) one page at a time. Pieces are rendered as their page
+    comes up, so only one page (and the pieces on it) is ever in memory.
+    `render(item, (width, height))` must return an image of exactly that size, the
+    right way up: rotated placements are turned here.
+    """
+    for page in pages:
+        sheet = Image.new('RGB', page_size_px, white)
+        for placement in page.placements:
+            if placement.rotated:
+                # Frontage on the left, so the piece reads bottom to top
+                piece = render(placement.item, (placement.height, placement.width)).transpose(Image.Transpose.ROTATE_90)
+            else:
+                piece = render(placement.item, (placement.width, placement.height))
+            sheet.paste(piece, (margin_px + placement.x, margin_px + placement.y))
+        yield page, sheet
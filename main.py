@@ -1,12 +1,30 @@
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from pprint import pprint
 from typing import List, Dict
 from enum import Enum, auto
 import math
-from datastore import read_csv, read_art_csv, ArtInfo, CampInfo, Kids, Food, InteractivityTime, CampType, SoundZone, SoundSize, SoundZoneHardPreference, Placeable
-import textwrap
+import os
+import functools
+from datastore import iter_camps, iter_arts, read_csv, read_art_csv, CAMPS_CSV, ART_CSV, NEIGHBORHOODS, ArtInfo, CampInfo, Kids, Food, InteractivityTime, CampType, SoundZone, SoundSize, SoundZoneHardPreference, Placeable
 import argparse
-from timing import timing
+from timing import timing, span, tracer
+import fonts
+import textfit
+import assets
+import tiles
+import glyphs
+from displaylist import DisplayList, Label, Picture, Ring, rasterize
+import runner
+import manifest
+import writer
+import impose
+import pdfwriter
+import overview
+import verify
+import server
+import svgbackend
+import rules
+import query
 
 DEBUG=True
 
@@ -23,13 +41,15 @@ SIGN_TEXT_WIDTH = 1970
 DEFAULT_FONT = './RobotoMono-Regular.ttf'
 FANCY_FONT = './Eilis-Regular.ttf'
 HARLEQUIN_FONT = './HarlequinFLF.ttf'
+# Sign names are a small alphabet at huge sizes, draw them from cached glyphs
+fonts.use_atlas(HARLEQUIN_FONT)
 
 # System dependent. There is a default if we don't specify any font thing.
 def get_font(size=SMALL_FONT_SIZE, font_name=None):
     font=DEFAULT_FONT
     if font_name is not None: 
         font = font_name
-    return ImageFont.truetype(font=font, size=size)
+    return fonts.get_font(font, size)
 
 BORDER_WIDTH = 2
 
@@ -64,12 +84,6 @@ interactivity_night = "#a0c4e8"
 interactivity_support = "#b6d7a8"
 
 # BASIC HELPERS
-def text_contains(text, names): 
-    for name in names: 
-        if name in text.lower():
-            return True
-    return False
-
 def get_pixels_from_feet(distance_in_feet):
   return distance_in_feet * PIXELS_PER_FOOT
 
@@ -80,20 +94,6 @@ def create_rectangle(drawer, text, width, height, color=black, bg=pink, font=12,
 
     return i
 
-def add_obj_to_image(image, rect, top_left):
-    image.paste(rect, box=top_left)
-
-def create_circle_with_number(number, diam, font=8):
-    # TODO FIGURE OUT TRANSPARENT BG
-    i = Image.new("RGB", (diam, diam), white)
-    drawer = ImageDraw.Draw(i)
-
-    tl = math.floor((diam - font) / 2)
-    drawer.arc((0,0, diam, diam), 0, 360, fill=black, width=BORDER_WIDTH)
-    drawer.text((tl, tl), str(number), fill=black, font=get_font(font))
-
-    return i
-
 # BORDER BARS
 class BorderBarPosition(Enum):
     LEFT = auto()
@@ -178,374 +178,183 @@ def place_bars(bars: List[BorderBar]) -> Dict[BorderBarPosition, List[BorderBar]
 
 # SHENNANIGANS
 def get_interactivity_time_color(camp: CampInfo):
-    if 'morning' in camp.interactivity_time.lower():
+    times = camp.interactivity_time
+    if InteractivityTime.MORNING in times:
         return interactivity_morning
-    if 'afternoon' in camp.interactivity_time.lower():
+    if times & (InteractivityTime.AFTERNOON | InteractivityTime.LATE_AFTERNOON):
         return interactivity_afternoon
-    if 'night' in camp.interactivity_time.lower():
+    if InteractivityTime.LATE_NIGHT in times:
         return interactivity_night
-    if 'support' in camp.interactivity_time.lower():
+    if times & (InteractivityTime.ART_SUPPORT | InteractivityTime.WORK_SUPPORT):
         return interactivity_support
     return white
 
-def get_font_size_for_area(text: str, width: int, height: int):
-    ratio = math.floor(width/len(text))
-    size = 10
-    wrap = len(text)
-    if ratio > 5:
-        # print(f'>=5 : {ratio} {text}')
-
-        size = math.floor(ratio * 1.8)
-        if size > (math.floor(height / 2)):
-            size = math.floor(height / 2)
-    elif ratio >= 4:
-        size = math.floor(ratio * 3)
-        if size > (math.floor(height / 2)):
-            size = math.floor(height / 2)
-        wrap = math.floor(len(text) * 3 / 5)
-    elif ratio >= 3:
-        size = math.floor(ratio * 3)
-        if size > (math.floor(height / 2)):
-            size = math.floor(height / 2)
-        wrap = math.floor(len(text) * 2 / 3)
-    elif ratio >= 2:
-        size = math.floor(ratio * 2)
-        if size > (math.floor(height / 2)):
-            size = math.floor(height / 2)
-        wrap = math.floor(len(text) * 2 / 3)
-    else:
-        size = math.floor(ratio * 2)
-        if size > (math.floor(height / 2)):
-            size = math.floor(height / 2)
-        wrap = math.floor(len(text) / 2)
-    return {'size': size, 'break': wrap}
+def get_font_size_for_area(text: str, width: int, height: int, wrap=True):
+    return textfit.fit_text(text, width, height, DEFAULT_FONT, max_size=max(height, 1), padding=1, wrap=wrap)
 
 def get_alias(camp: CampInfo):
-    name = camp.name
-    lowercase_name = name.lower()
-    replacements = {
-        'astro shack': 'Astro Shack',
-        'bowlovfarts': 'Bowlovfarts',
-        'black rock observatory': 'BR Obsv',
-        'black rock center for unlearning': 'Center for Unlearning',
-        'brother monk': 'Brother Monk\'s',
-        'community conch': 'Cmty Conch ASC',
-        'clusterfuck': 'Clusterfuck',
-        'cbgb': 'CBGB',
-        'costco': 'Costco',
-        'dogs n recreation': 'Dogs n Rec',
-        'super happy invincible titanic': 'SHIT',
-        'teenie weenie art tent': 'TWAT',
-        'you are here': 'U R Here',
-        'cult of the peach': 'Cult of the Peach',
-        'absinthe minded': 'Absinthe',
-        'camp chai': 'Cp Chai',
-        'cracked pot': 'Crkd Pot',
-        'divisional spaces': 'Divis. Spaces',
-        'elation station': 'Elat\'n Stn.',
-        'flower bower': 'Flower Bower  ',
-        'hedgehog hegemony': 'HHH',
-        'smash that': 'I Smsh Tht',
-        'krampus': 'krampus',
-        'polyjamorous': 'Polyjamorous',
-        'principles fantastica': 'P\'s Fantastica',
-        'second rodeo': 'Second Rodeo    ',
-        'adventurer\'s respite': 'Adventurer\'s Respite',
-        'garden of otherworldly delights': 'Gd Other- worldly Del',
-        'secret of mems': 'Secret of Mems',
-        'tiny tramp': 'Tiny Tramp Espr',
-        'unityhaven': 'Unity Haven   '
-    }
+    "The name on the camp's map piece: a shorter one from rules.json if it has one."
+    return rules.get_rules().name('piece_names', camp.name)
 
-    for substr, replacement in replacements.items():
-        if substr in lowercase_name:
-            return replacement
-    return name
-
-
-def get_sign_alias(thing: Placeable):
-    # TODO: Delete this. It's moved into placeable.
-    return thing.name
-
-
-def get_camp_sign_font_size(camp): 
-    text = get_sign_alias(camp)
-
-    height = SIGN_TEXT_HEIGHT
-    width = SIGN_TEXT_WIDTH
-
-    ratio = math.floor(width/len(text))
-    size = 450
-    wrap = 8
-
-    camp_name_words = text.split(' ')
-
-    if len(camp_name_words) > 3: 
-        wrap = 12
-        size = 350
-        
-    for word in camp_name_words: 
-        if len(word) >=15: 
-            wrap = 15
-            size = 280
-        elif len(word) >=13:
-            wrap = 14
-            size = 290
-        elif len(word) >= 12: 
-            wrap=13
-            size= 310
-        elif len(word) == 11:
-            wrap = 12
-            size = 350
-        elif len(word) >= 9:
-            wrap = 11
-            size = 400
-
-
-    # Handle special camp names that don't behave nicely
-    # Mega long names
-
-    if text_contains(text, ['wharf', 'conch', 'bowlovfarts', 'costco', 'sex positivity', 'cbgb']): 
-        wrap = 14
-        size = 280
-    elif text_contains(text, ['observatory']): 
-        wrap = 16
-        size = 280 
-    elif text_contains(text, ['teenie weenie', 'monkey business', 'dtf', 'mbs', 'super happy', 'unlearning', 'snail trail', 'ranger meadow', 'temple', 'second hand booze bar']):  # 3 lines max height
-        size = 305
-    elif text_contains(text, ['talk with strangers']):
-        size = 340            
-    elif text_contains(text, ['black hole', 'butt hurt',  'church of cheese', 'cirque de licious', 'dr. bev', 'noods', 'smash that', 'hell bake']): 
-        size = 400
-        wrap = 11
-    elif text_contains(text, ['clusterfuck']): 
-        size = 400
-    elif text_contains(text, ['hypnodrome']): 
-        size = 360
-
-    return {'size': size, 'break': wrap}
-
-def gen_sign_for_camp(camp: CampInfo):
-    img = gen_sign_generic(camp, get_camp_sign_font_size)
-
-    icon_y_offset = 525
-    icon_x_offset = 525
-    icon_dimensions = 350
-
-    icon_top = landscape_height_in_px - icon_y_offset
-    # Icons
-    if camp.fire or camp.fire_circle: 
-        add_obj_to_image(
-            img, 
-            Image.open('./sign_assets/2-Fire-Icon.png').resize((icon_dimensions, icon_dimensions)),
-            (landscape_width_in_px - icon_x_offset, icon_top)
-        )
-        icon_x_offset += 350
 
-    if camp.xxx: 
-        add_obj_to_image(
-            img, 
-            Image.open('./sign_assets/3-Eighteen-Icon.png').resize((icon_dimensions, icon_dimensions)),
-            (landscape_width_in_px - icon_x_offset, icon_top)
-        )
-        icon_x_offset += 350
+# Name box on the sign. A little breathing room so the letters don't touch the edge of the black box.
+SIGN_TEXT_PADDING = 40
+SIGN_MAX_FONT_SIZE = 450
 
-    if camp.food != Food.NONE: 
-        add_obj_to_image(
-            img, 
-            Image.open('./sign_assets/4-Food-Icon.png').resize((icon_dimensions, icon_dimensions)),
-            (landscape_width_in_px - icon_x_offset, icon_top)
-        )
-        icon_x_offset += 350
+def get_sign_font_size(thing: Placeable):
+    pinned = rules.get_rules().sign_size(thing.name)
+    if pinned:
+        return pinned
+    return textfit.fit_text(thing.get_name(), SIGN_TEXT_WIDTH, SIGN_TEXT_HEIGHT, HARLEQUIN_FONT,
+                            max_size=SIGN_MAX_FONT_SIZE, padding=SIGN_TEXT_PADDING)
 
-    if camp.bar:
-        add_obj_to_image(
-            img, 
-            Image.open('./sign_assets/6-Drink-Icon.png').resize((icon_dimensions, icon_dimensions)),
-            (landscape_width_in_px - icon_x_offset, icon_top)
-        )
-        icon_x_offset += 350
+def get_camp_sign_font_size(camp: CampInfo):
+    return get_sign_font_size(camp)
+
+def layout_sign_for_camp(camp: CampInfo) -> DisplayList:
+    sign = layout_sign_generic(camp, get_camp_sign_font_size)
+    template = get_sign_template()
 
+    # Icons, filled into the slots from the right edge inwards
+    icons = []
+    if camp.fire or camp.fire_circle: 
+        icons.append('./sign_assets/2-Fire-Icon.png')
+    if camp.xxx: 
+        icons.append('./sign_assets/3-Eighteen-Icon.png')
+    if camp.food != Food.NONE: 
+        icons.append('./sign_assets/4-Food-Icon.png')
+    if camp.bar:
+        icons.append('./sign_assets/6-Drink-Icon.png')
     if camp.sound_size != SoundSize.NONE:
-        add_obj_to_image(
-            img, 
-            Image.open('./sign_assets/7-Music-Icon.png').resize((icon_dimensions, icon_dimensions)),
-            (landscape_width_in_px - icon_x_offset, icon_top)
-        )
+        icons.append('./sign_assets/7-Music-Icon.png')
 
+    for icon, (x, y) in zip(icons, template.icon_slots):
+        sign.add(Picture(icon, x, y, template.icon_size, template.icon_size))
 
-    return img
+    return sign
 
+def gen_sign_for_camp(camp: CampInfo, scale=1.0):
+    return rasterize(layout_sign_for_camp(camp), scale)
 
-def gen_sign_for_art(art: ArtInfo):
-    img = gen_sign_generic(art, get_art_sign_font_size)
+
+def layout_sign_for_art(art: ArtInfo) -> DisplayList:
+    sign = layout_sign_generic(art, get_art_sign_font_size)
 
     if art.number: 
-        icon_y_offset = 525
-        icon_x_offset = 525
-        icon_dimensions = 350
-        icon_top = landscape_height_in_px - icon_y_offset
-        draw = ImageDraw.Draw(img)
-
-        add_obj_to_image(
-            img,
-            create_rectangle(draw, art.number, 600, icon_dimensions, bg=black, font=350, color=white, align='right', font_name=HARLEQUIN_FONT),
-            (landscape_width_in_px - 750, icon_top),
-        )
+        template = get_sign_template()
+        sign.add(Label(art.number, landscape_width_in_px - 750, template.icon_top, 600, template.icon_size,
+                       color=white, bg=black, font_path=HARLEQUIN_FONT, size=350, align='right'))
 
-    
-    return img
-
-def get_art_sign_font_size(art): 
-    text = art.name
-
-    height = SIGN_TEXT_HEIGHT
-    width = SIGN_TEXT_WIDTH
-
-    ratio = math.floor(width/len(text))
-    size = 450
-    wrap = 8
-
-    camp_name_words = text.split(' ')
-
-    if len(camp_name_words) > 3: 
-        wrap = 12
-        size = 350
-        
-    for word in camp_name_words: 
-        if len(word) >= 16: 
-            print(word)
-            wrap = 18
-            size = 200
-        elif len(word) >=15: 
-            wrap = 15
-            size = 280
-        elif len(word) >=13:
-            wrap = 14
-            size = 290
-        elif len(word) >= 12: 
-            wrap=13
-            size= 310
-        elif len(word) == 11:
-            wrap = 12
-            size = 350
-        elif len(word) >= 9:
-            wrap = 11
-            size = 400
-
-
-    # # Handle special camp names that don't behave nicely
-
-    if text_contains(text, ['projection']): 
-        wrap = 15
-        size = 280
-    elif text_contains(text, ['cosmic fire turtle', 'swim the smack']):
-        wrap = 16
-        size = 280
-    elif text_contains(text, ['plankton']): 
-        wrap = 16
-        size = 305
-    elif text_contains(text, ['celestial', 'cosmic portal', 'jellyfish on the bluff', 'love thy beast', 'sad lonely museum', 'bright, bob', 'principles fantastica', 'zen generator', 'wisdom willow']):  # 3 lines max height
-        size = 305
-    elif text_contains(text, ['talk with strangers', 'school of dreams', 'slow camera']):
-        size = 340            
-    elif text_contains(text, ['short bus', 'soak sign shop']):  
-        size = 400
-        wrap = 11
-    elif text_contains(text, ['clusterfuck']): 
-        size = 400
-    elif text_contains(text, ['hypnodrome']): 
-        size = 360
-
-    print( {'size': size, 'break': wrap})
-    return {'size': size, 'break': wrap}
-
-
-def gen_sign_generic(thing: Placeable, sizer): 
-     # size of camp sign png
-    landscape_width_in_px = 3301
-    landscape_height_in_px = 2551
-    SIGN_TEXT_HEIGHT = 880
-    SIGN_TEXT_WIDTH = 1970
-
-    img = Image.new("RGB", (landscape_width_in_px, landscape_height_in_px), white)
-    draw = ImageDraw.Draw(img)
-
-        # BG Image
-    add_obj_to_image(
-        img,
-        Image.open('./sign_assets/1-Sign-Blank.png').resize((landscape_width_in_px, landscape_height_in_px)),
-        (0, 0) # start at bottom left, offset by how tall the rectangle is.
-    )
+    return sign
+
+def gen_sign_for_art(art: ArtInfo, scale=1.0):
+    return rasterize(layout_sign_for_art(art), scale)
+
+def get_art_sign_font_size(art: ArtInfo):
+    return get_sign_font_size(art)
 
-    
+
+class SignTemplate(object):
+    "Everything that's the same on every sign: the background and where the icons go."
+
+    ICON_SIZE = 350
+    ICON_SLOT_COUNT = 5
+    BLANK = './sign_assets/1-Sign-Blank.png'
+
+    def __init__(self):
+        self.width = landscape_width_in_px
+        self.height = landscape_height_in_px
+        self.icon_size = self.ICON_SIZE
+        self.icon_top = self.height - 525
+        # Right to left, one icon wide each
+        self.icon_slots = [
+            (self.width - (525 + i * self.icon_size), self.icon_top)
+            for i in range(self.ICON_SLOT_COUNT)
+        ]
+        self.name_box = (625, 120, 625 + SIGN_TEXT_WIDTH, 120 + SIGN_TEXT_HEIGHT)
+
+    def new_sign(self) -> DisplayList:
+        return DisplayList(self.width, self.height, background=white, background_image=self.BLANK)
+
+@functools.lru_cache(maxsize=None)
+def get_sign_template():
+    return SignTemplate()
+
+def layout_sign_generic(thing: Placeable, sizer) -> DisplayList:
+    template = get_sign_template()
+    sign = template.new_sign()
 
     sw = sizer(thing)
     art_name_size = sw["size"]
     art_name_wrap = sw["break"]
     
-    wrapped_name = '\n'.join(textwrap.wrap(thing.get_name(), art_name_wrap))
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, wrapped_name, SIGN_TEXT_WIDTH, SIGN_TEXT_HEIGHT, bg=black, font=art_name_size, color=white, align='center', font_name=HARLEQUIN_FONT),
-        (625, 120),
-    )
+    wrapped_name = '\n'.join(textfit.wrap(thing.get_name(), art_name_wrap))
+    sign.add(Label(wrapped_name, template.name_box[0], template.name_box[1], SIGN_TEXT_WIDTH, SIGN_TEXT_HEIGHT,
+                   color=white, bg=black, font_path=HARLEQUIN_FONT, size=art_name_size, align='center'))
 
-    return img
+    return sign
 
 
 # MAKE THE IMAGE FOR CAMPS
-def gen_image_for_camp(camp: CampInfo):
-
+def get_piece_dimensions(camp: CampInfo):
+    "A piece's frontage and depth in pixels, a sixth of its shorter side, and its header height."
     frontage_in_px = math.floor(get_pixels_from_feet(camp.width))
     depth_in_px = math.floor(get_pixels_from_feet(camp.height))
 
-    img = Image.new("RGB", (frontage_in_px, depth_in_px), white)
-
-    draw = ImageDraw.Draw(img)
-
-
     wider = camp.width > camp.height
     smaller_sixth = math.floor(frontage_in_px / 6)
     if wider:
         smaller_sixth = math.floor(depth_in_px / 6)
-    HEADER_HEIGHT = math.floor(depth_in_px / 6)
-
-    smaller_sixth_font_size = smaller_sixth - 5
+    return frontage_in_px, depth_in_px, smaller_sixth, math.floor(depth_in_px / 6)
 
-    # Neighborhood Preference
+def get_neighborhood_preference(camp: CampInfo):
     neighborhood_preference = ''
     for preference in camp.neighborhood_preference:
         neighborhood_preference += f'{preference} '
-    header_font_size = get_font_size_for_area(neighborhood_preference, math.floor(frontage_in_px/2), HEADER_HEIGHT)["size"]
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, neighborhood_preference, math.floor(frontage_in_px/2), HEADER_HEIGHT, bg=grey, font=header_font_size, color=black),
-        (0,0) # start at top left.
+    return neighborhood_preference
+
+def get_piece_font_sizes(camp: CampInfo):
+    "The header size and the camp name's fit ({'size', 'break'}) for a piece. All of a piece's text fitting."
+    frontage_in_px, depth_in_px, smaller_sixth, HEADER_HEIGHT = get_piece_dimensions(camp)
+    # Both header halves share a size, so it has to suit both of them (the neighborhoods can be blank).
+    # They're drawn on one line, so they're fitted on one line.
+    header_font_size = min(
+        get_font_size_for_area(get_neighborhood_preference(camp), math.floor(frontage_in_px/2), HEADER_HEIGHT, wrap=False)["size"],
+        get_font_size_for_area(camp.sound_zone.value, math.floor(frontage_in_px/2), HEADER_HEIGHT, wrap=False)["size"],
     )
+    name_fit = get_font_size_for_area(get_alias(camp), frontage_in_px - (2 * smaller_sixth), (2 * HEADER_HEIGHT))
+    return header_font_size, name_fit
+
+def layout_piece(camp: CampInfo) -> DisplayList:
+    "Where everything on a camp's map piece goes, in pixels at PIXELS_PER_FOOT."
+
+    frontage_in_px, depth_in_px, smaller_sixth, HEADER_HEIGHT = get_piece_dimensions(camp)
+
+    piece = DisplayList(frontage_in_px, depth_in_px, background=white)
+
+    smaller_sixth_font_size = smaller_sixth - 5
+    header_font_size, sw = get_piece_font_sizes(camp)
+
+    # Neighborhood Preference
+    neighborhood_preference = get_neighborhood_preference(camp)
+    piece.add(Label(neighborhood_preference, 0, 0, # start at top left.
+                    math.floor(frontage_in_px/2), HEADER_HEIGHT, color=black, bg=grey, font_path=DEFAULT_FONT, size=header_font_size, repeats=True))
 
     # SZ Header
     fg = black
     if camp.sound_zone_hard_preference == SoundZoneHardPreference.YES:
         fg = red
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, camp.sound_zone, math.floor(frontage_in_px/2), HEADER_HEIGHT, bg=COLORS[camp.sound_zone], font=header_font_size, color=fg),
-        (math.floor(frontage_in_px/2), 0) # start at top center.
-    )
+    piece.add(Label(camp.sound_zone.value, math.floor(frontage_in_px/2), 0, # start at top center.
+                    math.floor(frontage_in_px/2), HEADER_HEIGHT, color=fg, bg=COLORS[camp.sound_zone.value], font_path=DEFAULT_FONT, size=header_font_size, repeats=True))
 
     # Camp Name
     camp_name = get_alias(camp)
-    sw = get_font_size_for_area(camp_name, math.floor(frontage_in_px * 4 / 6), math.floor(depth_in_px * 4 / 6))
     camp_name_size = sw["size"]
     camp_name_wrap = sw["break"]
 
-    wrapped_name = '\n'.join(textwrap.wrap(camp_name, width=camp_name_wrap))
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, wrapped_name, frontage_in_px - (2 * smaller_sixth), (2 * HEADER_HEIGHT), bg=get_interactivity_time_color(camp), font=camp_name_size),
-        (smaller_sixth, HEADER_HEIGHT),
-    )
+    wrapped_name = '\n'.join(textfit.wrap(camp_name, width=camp_name_wrap))
+    piece.add(Label(wrapped_name, smaller_sixth, HEADER_HEIGHT, frontage_in_px - (2 * smaller_sixth), (2 * HEADER_HEIGHT),
+                    color=black, bg=get_interactivity_time_color(camp), font_path=DEFAULT_FONT, size=camp_name_size))
 
     # Border Bars
     border_bars = place_bars(generate_border_bars_for_camp(camp))
@@ -567,9 +376,7 @@ def gen_image_for_camp(camp: CampInfo):
         bar_sections = len(bars)
         bar_width = math.floor(width/bar_sections)
 
-        rotation = -90
-        if position == BorderBarPosition.BOTTOM:
-            rotation = 0
+        rotate = position != BorderBarPosition.BOTTOM
 
         bar_offset = 0 # space occupied by other bar splits.
 
@@ -588,12 +395,8 @@ def gen_image_for_camp(camp: CampInfo):
             if bar_font > 12:
                 bar_font = 12
 
-            in_progress = create_rectangle(draw, bar.text, bar_width, height, bg=bar.background_color, color=bar.text_color, font=bar_font)
-            add_obj_to_image(
-                img,
-                in_progress.rotate(rotation, expand=1),
-                (x_position, y_pos)
-            )
+            piece.add(Label(bar.text, x_position, y_pos, bar_width, height, color=bar.text_color, bg=bar.background_color,
+                            font_path=DEFAULT_FONT, size=bar_font, rotate=rotate, repeats=True))
             bar_offset += bar_width
 
     # DIMS
@@ -601,63 +404,555 @@ def gen_image_for_camp(camp: CampInfo):
     dim_font_size = smaller_sixth_font_size
     if camp.width >= 100 or camp.height >= 100:
         dim_font_size=math.floor(.6 * smaller_sixth_font_size)
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, str(camp.width), smaller_sixth, smaller_sixth, bg=white, color=black, font=dim_font_size),
-        (smaller_sixth, img.height - (HEADER_HEIGHT + smaller_sixth)) # start at bottom left, offset by how tall the rectangle is.
-    )
+    piece.add(Label(str(camp.width),
+                    smaller_sixth, depth_in_px - (HEADER_HEIGHT + smaller_sixth), # start at bottom left, offset by how tall the rectangle is.
+                    smaller_sixth, smaller_sixth, color=black, bg=white, font_path=DEFAULT_FONT, size=dim_font_size, repeats=True))
     # (DEPTH)
-    add_obj_to_image(
-        img,
-        create_rectangle(draw, str(camp.height), smaller_sixth, smaller_sixth, bg=white, color=black, font=dim_font_size ).rotate(-90, expand=1),
-        (smaller_sixth, img.height - (2 * smaller_sixth + HEADER_HEIGHT)) # start at bottom left, offset by how tall the rectangle is.
-    )
+    piece.add(Label(str(camp.height),
+                    smaller_sixth, depth_in_px - (2 * smaller_sixth + HEADER_HEIGHT), # start at bottom left, offset by how tall the rectangle is.
+                    smaller_sixth, smaller_sixth, color=black, bg=white, font_path=DEFAULT_FONT, size=dim_font_size, rotate=True, repeats=True))
 
     # COFFEE
     if camp.coffee:
-        add_obj_to_image(
-            img,
-            Image.open('./assets/coffee.png').resize((smaller_sixth, smaller_sixth)),
-            (frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth)) # start at bottom left, offset by how tall the rectangle is.
-        )
+        piece.add(Picture('./assets/coffee.png',
+                          frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth), # start at bottom left, offset by how tall the rectangle is.
+                          smaller_sixth, smaller_sixth))
     # TEA
     if camp.tea:
-        add_obj_to_image(
-            img,
-            Image.open('./assets/tea.jpg').resize((smaller_sixth, smaller_sixth)),
-            (frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth)) # start at bottom left, offset by how tall the rectangle is.
-        )
+        piece.add(Picture('./assets/tea.jpg',
+                          frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth), # start at bottom left, offset by how tall the rectangle is.
+                          smaller_sixth, smaller_sixth))
 
     if camp.sound_size != SoundSize.NONE:
-        add_obj_to_image(
-            img,
-            Image.open(f'./assets/sound_{camp.sound_size.value}.jpg').resize((smaller_sixth, smaller_sixth)),
-            (frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + (2 * smaller_sixth))) # start at bottom left, offset by how tall the rectangle is.
-        )
+        piece.add(Picture(f'./assets/sound_{camp.sound_size.value}.jpg',
+                          frontage_in_px - (3 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + (2 * smaller_sixth)), # start at bottom left, offset by how tall the rectangle is.
+                          smaller_sixth, smaller_sixth))
 
     # RV Circle
     if camp.rv_count > 0:
         # RV Circle
-        add_obj_to_image(
-            img,
-            create_circle_with_number(camp.rv_count, smaller_sixth, font=10),
-            (frontage_in_px - (2 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth)) # start at bottom left, offset by how tall the rectangle is.
-        )
+        piece.add(Ring(camp.rv_count,
+                       frontage_in_px - (2 * smaller_sixth), depth_in_px - (HEADER_HEIGHT + smaller_sixth), # start at bottom left, offset by how tall the rectangle is.
+                       smaller_sixth, line_width=BORDER_WIDTH, color=black, bg=white, font_path=DEFAULT_FONT, size=10))
 
     # print("Camp: ", camp)
 
-    return img
+    return piece
 
-def main_art(arts, substring_match):
-    for i, art in enumerate(arts):
-            if substring_match and substring_match.lower() not in art.name.lower():
-                continue
-            with timing('gen sign for %s' % art.name, debug=True):
-                img = gen_sign_for_art(art)
+def gen_image_for_camp(camp: CampInfo, scale=1.0):
+    return rasterize(layout_piece(camp), scale)
+
+def print_cache_stats(args):
+    # Workers keep their own caches, so the parent's numbers only mean something for serial runs.
+    if DEBUG and args.jobs <= 1:
+        print(f'font cache: {fonts.registry.stats()}')
+        print(f'asset cache: {assets.cache.stats()}')
+        print(f'tile cache: {tiles.cache.stats()}')
+        print(f'glyph atlas: {glyphs.atlas.stats()}')
+
+def piece_filename(camp: CampInfo):
+    return writer.image_writer.filename(camp, 'images')
+
+def camp_sign_filename(camp: CampInfo):
+    return writer.image_writer.filename(camp, 'sign_images', suffix="_sign")
 
-            with open(art.to_filename('sign_images/art', suffix="_sign"), 'w') as f:
-                with timing('saving image', debug=DEBUG):
-                    img.save(f, subsampling=0, quality=100)
+def art_sign_filename(art: ArtInfo):
+    return writer.image_writer.filename(art, 'sign_images/art', suffix="_sign")
+
+# Sizes to also write every image at, besides the normal one (--scale). Set per process by configure_worker.
+EXTRA_SCALES = ()
+# Render workers that outlive a single build (watch with --jobs), see runner.WorkerPool
+WORKER_POOL = None
+
+def scaled_filename(filename, scale):
+    "images/fire_camp.jpg at 0.25 goes in images_0.25x/fire_camp.jpg"
+    top, _, rest = filename.partition('/')
+    return f'{top}_{scale:g}x/{rest}'
+
+def output_files(filename):
+    "Every file written for one output: the normal size and the --scale copies."
+    return [filename] + [scaled_filename(filename, scale) for scale in EXTRA_SCALES]
+
+def draw(display_list: DisplayList, scale=1.0):
+    "The display list as whatever the writer is writing: an image, or SVG text with --backend svg."
+    if writer.image_writer.format.name == 'svg':
+        return svgbackend.to_svg(display_list, scale)
+    return rasterize(display_list, scale)
+
+def submit_scaled(display_list: DisplayList, filename):
+    """
+    Draws the display list at its normal size and every EXTRA_SCALES, queueing
+    each for the writer. The layout isn't redone per size. Resolves to the normal
+    size's filename and the bytes of all of them.
+    """
+    writes = [writer.image_writer.submit(draw(display_list), filename)]
+    for scale in EXTRA_SCALES:
+        scaled = scaled_filename(filename, scale)
+        os.makedirs(os.path.dirname(scaled), exist_ok=True)
+        with span('rasterize', 'item', {'scale': scale}):
+            img = draw(display_list, scale)
+        writes.append(writer.image_writer.submit(img, scaled))
+    return writer.combine(writes)
+
+# These hand the finished image to the writer stage and return straight away,
+# so the next item can render while this one is encoded.
+def render_piece(camp: CampInfo):
+    with span('piece', 'item', {'camp': camp.name}):
+        return submit_scaled(layout_piece(camp), piece_filename(camp))
+
+def render_camp_sign(camp: CampInfo):
+    with span('camp sign', 'item', {'camp': camp.name}):
+        return submit_scaled(layout_sign_for_camp(camp), camp_sign_filename(camp))
+
+def render_art_sign(art: ArtInfo):
+    with span('art sign', 'item', {'art': art.name}):
+        return submit_scaled(layout_sign_for_art(art), art_sign_filename(art))
+
+def piece_fingerprint(camp: CampInfo):
+    files = [DEFAULT_FONT]
+    if camp.coffee:
+        files.append('./assets/coffee.png')
+    if camp.tea:
+        files.append('./assets/tea.jpg')
+    if camp.sound_size != SoundSize.NONE:
+        files.append(f'./assets/sound_{camp.sound_size.value}.jpg')
+    # The fitted sizes and wraps, as laid out: changing how text is fitted changes the piece
+    sizing = [(op.text, op.size) for op in layout_piece(camp).ops if isinstance(op, Label)]
+    return manifest.fingerprint({'fields': camp.fields(), 'alias': get_alias(camp), 'sizing': sizing}, files)
+
+def camp_sign_fingerprint(camp: CampInfo):
+    files = [HARLEQUIN_FONT, './sign_assets/1-Sign-Blank.png']
+    if camp.fire or camp.fire_circle:
+        files.append('./sign_assets/2-Fire-Icon.png')
+    if camp.xxx:
+        files.append('./sign_assets/3-Eighteen-Icon.png')
+    if camp.food != Food.NONE:
+        files.append('./sign_assets/4-Food-Icon.png')
+    if camp.bar:
+        files.append('./sign_assets/6-Drink-Icon.png')
+    if camp.sound_size != SoundSize.NONE:
+        files.append('./sign_assets/7-Music-Icon.png')
+    inputs = {'fields': camp.fields(), 'name': camp.get_name(), 'sizing': get_camp_sign_font_size(camp)}
+    return manifest.fingerprint(inputs, files)
+
+def art_sign_fingerprint(art: ArtInfo):
+    inputs = {'fields': art.fields(), 'name': art.get_name(), 'sizing': get_art_sign_font_size(art)}
+    return manifest.fingerprint(inputs, [HARLEQUIN_FONT, './sign_assets/1-Sign-Blank.png'])
+
+def configure_worker(asset_cache_dir, output_format, writer_threads, trace=False, scales=()):
+    global EXTRA_SCALES
+    EXTRA_SCALES = tuple(scale for scale in scales if scale != 1)
+    if trace:
+        tracer.enable()
+    if asset_cache_dir:
+        assets.use_disk_cache(asset_cache_dir)
+    writer.configure(output_format, writer_threads)
+
+def output_format_from_args(args):
+    if args.backend == 'svg':
+        return writer.output_format('svg')
+    return writer.output_format(args.format, args.quality)
+
+def worker_args_from_args(args, scales=None):
+    "configure_worker's arguments, for the render workers."
+    return (args.asset_cache, output_format_from_args(args), args.writer_threads, bool(args.trace),
+            args.scale if scales is None else scales)
+
+def configure_from_args(args):
+    configure_worker(*worker_args_from_args(args))
+
+def matches_substring(thing: Placeable, substring_match):
+    return not substring_match or substring_match.lower() in thing.name.lower()
+
+def select(things, kind, args):
+    "The camps or art --substring and every --where pick out."
+    return query.where((thing for thing in things if matches_substring(thing, args.substring)), kind, args.where)
+
+def is_partial(args):
+    return bool(args.substring or args.where)
+
+def render_all(render, things, args):
+    results = []
+    for result in runner.run(render, things, jobs=args.jobs, initializer=configure_worker,
+                             initargs=worker_args_from_args(args), pool=WORKER_POOL):
+        if result.ok and DEBUG:
+            print(f'{result.item.name} took {result.seconds:.3f} seconds (then {result.waited:.3f} waiting on the write), '
+                  f'{result.value.bytes} bytes')
+        results.append(result)
+    return results
+
+def build(render, things, args, section, output_for, fingerprint_for):
+    """
+    Renders whatever in `things` is out of date according to the build manifest and
+    returns the number of failures. Unless --force, outputs whose fingerprint hasn't
+    changed since the last run are skipped.
+    """
+    output_format = output_format_from_args(args)
+    build_manifest = manifest.Manifest(f'{section}:{output_format.name}')
+    # Same output path, different encoder settings (e.g. --quality) still means a re-render
+    encoding = repr(sorted(output_format.save_options.items()))
+    if EXTRA_SCALES:
+        encoding += f' scales={EXTRA_SCALES}'
+    with span('fingerprint', 'stage', {'section': section}):
+        digests = {output_for(thing): f'{fingerprint_for(thing)} {encoding}' for thing in things}
+    todo = [thing for thing in things if args.force or not build_manifest.is_current(output_for(thing), digests[output_for(thing)])]
+    print(f'{len(things) - len(todo)} of {len(things)} up to date')
+
+    with span('render', 'stage', {'section': section, 'items': len(todo)}):
+        results = render_all(render, todo, args)
+    for result in results:
+        output = output_for(result.item)
+        if result.ok:
+            build_manifest.record(output, digests[output], output_files(output))
+        else:
+            build_manifest.forget(output)
+
+    # Only a full run knows which camps have left the sheet.
+    if not is_partial(args):
+        for removed in build_manifest.prune(digests):
+            print(f'Removed {removed}, it is no longer in the sheet')
+    build_manifest.save()
+
+    failures = runner.print_summary(results, describe=lambda thing: thing.name)
+    written = sum(result.value.bytes for result in results if result.ok)
+    if results:
+        print(f'{written / 1e6:.1f} MB written as {output_format.name}')
+    return failures
+
+def build_art_signs(args):
+    print('art')
+    with timing("reading csv", debug=DEBUG):
+        arts = select(iter_arts(args.art_csv), ArtInfo, args)
+    with timing("doing all images", debug=DEBUG):
+        return build(render_art_sign, arts, args, 'sign_images/art', art_sign_filename, art_sign_fingerprint)
+
+def select_pieces(args):
+    camps = select(iter_camps(args.camps_csv), CampInfo, args)
+    renderable = []
+    for camp in camps:
+        # TODO handle tiny camps
+        if camp.is_tiny():
+            print(f"Skipping {camp} because their frontage is too small for now.")
+            continue
+        renderable.append(camp)
+    return renderable
+
+def build_pieces(args):
+    renderable = select_pieces(args)
+    with timing("doing all pieces", debug=DEBUG):
+        return build(render_piece, renderable, args, 'images', piece_filename, piece_fingerprint)
+
+def build_camp_signs(args):
+    print('camps')
+    camps = select(iter_camps(args.camps_csv), CampInfo, args)
+    with timing("doing all signs", debug=DEBUG):
+        return build(render_camp_sign, camps, args, 'sign_images', camp_sign_filename, camp_sign_fingerprint)
+
+# Signs are 3301x2551, so at 300 DPI a page of the book is US letter landscape.
+BOOK_DPI = 300
+
+def page_ranges(text):
+    "'1-20,35' -> [1, 2, ..., 20, 35], for --pages."
+    pages = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'{text!r} is not a page range like 1-20,35') from None
+        if first < 1 or last < first:
+            raise argparse.ArgumentTypeError(f'{part.strip()!r} is not a page range, pages count from 1')
+        pages.extend(range(first, last + 1))
+    return pages
+
+def book_page(gen, quality, thing):
+    "A sign rasterized and compressed in whichever process rendered it, so only the JPEG comes back."
+    with span('book page', 'item', {'name': thing.name}):
+        return pdfwriter.encode_page(gen(thing), quality)
+
+def build_book(args, things, gen):
+    """
+    Writes every sign in `things` (or just the --pages of them) as a page of one PDF,
+    in sheet order. Pages go into the file as they're rendered, so only a page or
+    two are ever held in memory, however long the book is.
+    """
+    numbered = list(enumerate(things, 1))
+    if args.pages:
+        wanted = set(args.pages)
+        numbered = [(number, thing) for number, thing in numbered if number in wanted]
+        missing = sorted(wanted - {number for number, _ in numbered})
+        if missing:
+            print(f'The book only has {len(things)} pages, skipping page(s) {", ".join(map(str, missing))}')
+
+    worker_args = worker_args_from_args(args, scales=())
+    # One sign per chunk and a couple of chunks per worker, so finished pages don't pile up waiting to be written
+    results = runner.run(functools.partial(book_page, gen, args.quality), [thing for _, thing in numbered],
+                         jobs=args.jobs, initializer=configure_worker, initargs=worker_args,
+                         size=1, max_pending=2 * args.jobs)
+    written = []
+    with pdfwriter.PdfWriter(args.book) as pdf:
+        for (number, _), result in zip(numbered, results):
+            if result.ok:
+                pdf.add_jpeg(result.value, dpi=BOOK_DPI)
+                if DEBUG:
+                    print(f'page {number}: {result.item.name} took {result.seconds:.3f} seconds')
+            # The page is in the file now, keep the outcome but not the JPEG
+            written.append(result._replace(value=None))
+    print(f'Wrote {len([result for result in written if result.ok])} pages to {args.book}')
+    return runner.print_summary(written, describe=lambda thing: thing.name)
+
+def build_camp_book(args):
+    camps = select(iter_camps(args.camps_csv), CampInfo, args)
+    with timing("sign book", debug=DEBUG):
+        return build_book(args, camps, gen_sign_for_camp)
+
+def build_art_book(args):
+    arts = select(iter_arts(args.art_csv), ArtInfo, args)
+    with timing("sign book", debug=DEBUG):
+        return build_book(args, arts, gen_sign_for_art)
+
+def impose_pieces(args):
+    """
+    Lays the map pieces out on printer pages at true scale: with the defaults a foot
+    is PIXELS_PER_FOOT pixels at 72 DPI, i.e. 30 feet to the inch.
+    """
+    pixels_per_foot = args.dpi / args.feet_per_inch
+    page_size_px, printable, margin_px = impose.page_pixels(impose.PAGE_SIZES[args.page_size], args.dpi, args.margin)
+    gap = math.ceil(args.gap * args.dpi)
+
+    def size_of(camp):
+        return (math.floor(camp.width * pixels_per_foot), math.floor(camp.height * pixels_per_foot))
+
+    def render(camp, size):
+        # Drawn at the page's resolution, not resampled
+        return rasterize(layout_piece(camp), size=size)
+
+    camps = []
+    oversize = []
+    for camp in select_pieces(args):
+        fits = impose.turned(*size_of(camp), printable[0], printable[1]) is not None
+        (camps if fits else oversize).append(camp)
+    for camp in oversize:
+        width, height = size_of(camp)
+        print(f'Skipping {camp.name}, at {width}x{height}px it is bigger than the '
+              f'{printable[0]}x{printable[1]}px printable area of a {args.page_size} page even turned')
+    with timing("packing", debug=DEBUG):
+        pages = impose.pack(camps, size_of, printable[0], printable[1], gap)
+    print(f'{len(camps)} pieces on {len(pages)} {args.page_size} pages')
+
+    with timing("imposing", debug=DEBUG):
+        if args.output.lower().endswith('.pdf'):
+            with pdfwriter.PdfWriter(args.output) as pdf:
+                for page, sheet in impose.render_pages(pages, render, page_size_px, margin_px):
+                    pdf.add_page(sheet, dpi=args.dpi)
+            print(f'Wrote {args.output}')
+        else:
+            os.makedirs(args.output, exist_ok=True)
+            writes = []
+            for page, sheet in impose.render_pages(pages, render, page_size_px, margin_px):
+                filename = f'{args.output}/page_{page.number:03d}.{writer.image_writer.format.extension}'
+                writes.append(writer.image_writer.submit(sheet, filename))
+            for write in writes:
+                print(f'Wrote {write.result().filename}')
+    return 1 if oversize else 0
+
+def overview_map(args):
+    """
+    One big image of every piece, grouped by each camp's first neighborhood choice,
+    written as zoomable tiles so it works at print resolution too.
+    """
+    def size_of(camp):
+        return (math.floor(camp.width * args.pixels_per_foot), math.floor(camp.height * args.pixels_per_foot))
+
+    groups = {code: [] for code in NEIGHBORHOODS}
+    groups[''] = []
+    for camp in select_pieces(args):
+        first_choice = camp.neighborhood_preference[0] if camp.neighborhood_preference else ''
+        groups.setdefault(first_choice, []).append(camp)
+    named_groups = [(NEIGHBORHOODS.get(code, code or 'No preference'), camps) for code, camps in groups.items()]
+
+    heading_height = math.floor(20 * args.pixels_per_foot)
+    gap = math.ceil(2 * args.pixels_per_foot)
+    layout = overview.layout_groups(named_groups, size_of, heading_height, gap)
+    print(f'Overview is {layout.width}x{layout.height}px')
+
+    def render(item):
+        if item.kind == 'heading':
+            return create_rectangle(None, item.value, item.width, item.height, bg=grey, color=black,
+                                    font=math.floor(item.height * 0.6), align='center')
+        return rasterize(layout_piece(item.value), size=(item.width, item.height))
+
+    with timing("overview tiles", debug=DEBUG):
+        dzi = overview.write_tiles(layout, render, args.output, tile_size=args.tile_size)
+    print(f'Wrote {dzi}')
+    return 0
+
+def verify_outputs(args):
+    "Compares the renders against the golden images and returns how many don't match."
+    pairs = []
+    for golden_dir, output_dir in (args.pair or verify.GOLDEN_DIRS):
+        found = verify.golden_pairs(golden_dir, output_dir)
+        if not found:
+            print(f'No golden images in {golden_dir}')
+        pairs.extend(pair for pair in found if not args.substring or args.substring.lower() in pair[0].lower())
+
+    results = list(verify.verify(pairs, args.tolerance, args.max_pixels, args.diff_dir, args.jobs))
+    mismatches = [result.value for result in results if result.ok and not result.value.ok]
+    for verdict in mismatches:
+        line = f'{verdict.output}: {verdict.reason}'
+        if verdict.pixels:
+            line += f', max difference {verdict.max_difference}'
+        if verdict.diff_image:
+            line += f', see {verdict.diff_image}'
+        print(line)
+    errors = [result for result in results if not result.ok]
+    for result in errors:
+        print(f'--- {result.item[1]} could not be compared')
+        print(result.error.rstrip())
+    identical = sum(1 for result in results if result.ok and result.value.reason == 'identical')
+    print(f'{len(pairs) - len(mismatches) - len(errors)} of {len(pairs)} match ({identical} byte-for-byte)')
+    return 1 if mismatches or errors or not pairs else 0
+
+def piece_image(camp: CampInfo):
+    # TODO handle tiny camps
+    if camp.is_tiny():
+        raise ValueError(f"{camp.name}'s frontage is too small for a piece for now.")
+    return gen_image_for_camp(camp)
+
+def serve_images(args):
+    """
+    Keeps the sheets, fonts and assets loaded and renders single pieces and signs
+    over HTTP on localhost, for when someone needs just one right now.
+    """
+    catalog = server.Catalog(read_csv(args.camps_csv), read_art_csv(args.art_csv))
+    kinds = {
+        'piece': server.Kind('camps', piece_image, piece_filename),
+        'camp sign': server.Kind('camps', gen_sign_for_camp, camp_sign_filename),
+        'art sign': server.Kind('arts', gen_sign_for_art, art_sign_filename),
+    }
+    server.serve(server.RenderService(catalog, kinds), args.port)
+    return 0
+
+# Which builds each watched input feeds
+WATCHED_FILES = {
+    DEFAULT_FONT: [build_pieces],
+    HARLEQUIN_FONT: [build_camp_signs, build_art_signs],
+    rules.RULES_PATH: [build_pieces, build_camp_signs, build_art_signs],
+}
+WATCHED_DIRECTORIES = {
+    './assets': [build_pieces],
+    './sign_assets': [build_camp_signs, build_art_signs],
+}
+
+def watch_and_rebuild(args):
+    """
+    Rebuilds whatever a saved file affects. Everything stays warm in this process
+    (and in the worker pool, with --jobs): fonts and assets are only reloaded when
+    their files change, and the build manifest means only the camps whose row
+    changed get re-rendered.
+
+    The code itself can't be reloaded, so editing a renderer source only gets a
+    reminder to restart. Its digest isn't forgotten either, so nothing drawn by the
+    old code gets recorded in the manifest as drawn by the new.
+    """
+    import watch
+
+    renderer_sources = {os.path.relpath(path) for path in manifest.RENDERER_SOURCES}
+    watched_files = {os.path.relpath(path): builds for path, builds in WATCHED_FILES.items()}
+    for path in renderer_sources:
+        watched_files.setdefault(path, [])
+    # With --workbook both of these are the same file
+    watched_files.setdefault(os.path.relpath(args.camps_csv), []).extend([build_pieces, build_camp_signs])
+    watched_files.setdefault(os.path.relpath(args.art_csv), []).append(build_art_signs)
+    watched_directories = {os.path.relpath(path): builds for path, builds in WATCHED_DIRECTORIES.items()}
+
+    def on_change(changed):
+        builds = []
+        stale_workers = False
+        for path in sorted(changed):
+            if path in renderer_sources:
+                print(f'{path} changed, restart watch to render with the new code')
+                continue
+            print(f'{path} changed')
+            manifest.forget_file_digest(path)
+            if path.endswith('.ttf'):
+                fonts.registry.clear()
+                tiles.cache.clear()
+                textfit.clear()
+                stale_workers = True
+            if path == os.path.relpath(rules.RULES_PATH):
+                rules.clear()
+                stale_workers = True
+            if os.path.dirname(path) in watched_directories:
+                assets.cache.clear()
+                get_sign_template.cache_clear()
+                stale_workers = True
+            for build_things in watched_files.get(path) or watched_directories.get(os.path.dirname(path), []):
+                if build_things not in builds:
+                    builds.append(build_things)
+
+        if stale_workers and WORKER_POOL:
+            WORKER_POOL.restart()
+        with timing('rebuild', debug=True):
+            for build_things in builds:
+                build_things(args)
+        if args.trace:
+            tracer.write(args.trace)
+        print('Watching for changes, Ctrl-C to stop')
+
+    print('Watching for changes, Ctrl-C to stop')
+    watch.watch(watched_files, watched_directories, on_change)
+
+def run_subcommand(args):
+    "Runs whichever subcommand args asks for and returns the exit status."
+    builders = {'pieces': build_pieces, 'camps': build_camp_signs, 'art': build_art_signs}
+    if args.backend == 'svg' and args.subcommand not in builders and args.subcommand != 'watch':
+        print(f'{args.subcommand} only makes raster images, --backend svg works with pieces, camps, art and watch')
+        return 2
+    if args.backend == 'svg' and getattr(args, 'book', None):
+        print('The sign book is made of raster pages, --backend svg does not work with --book')
+        return 2
+    try:
+        status = run_builder(args, builders)
+    except query.QueryError as e:
+        print(e)
+        return 2
+    rules.save_cache()
+    return status
+
+def run_builder(args, builders):
+    if args.subcommand == 'impose':
+        return impose_pieces(args)
+    if args.subcommand == 'overview':
+        return overview_map(args)
+    if args.subcommand == 'serve':
+        return serve_images(args)
+    if args.subcommand == 'verify':
+        return verify_outputs(args)
+    if args.subcommand == 'watch':
+        global WORKER_POOL
+        if args.jobs > 1:
+            # The same workers for every rebuild, so their caches stay warm too
+            WORKER_POOL = runner.WorkerPool(args.jobs, configure_worker, worker_args_from_args(args))
+        try:
+            for build_things in builders.values():
+                build_things(args)
+            args.force = False
+            print_cache_stats(args)
+            watch_and_rebuild(args)
+        finally:
+            if WORKER_POOL:
+                WORKER_POOL.close()
+                WORKER_POOL = None
+        return 0
+
+    if getattr(args, 'book', None):
+        books = {'camps': build_camp_book, 'art': build_art_book}
+        failures = books[args.subcommand](args)
+    else:
+        failures = builders[args.subcommand](args)
+    print_cache_stats(args)
+    return 1 if failures else 0
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -665,50 +960,103 @@ if __name__ == '__main__':
                         description='Generates map pieces and signs for soak')
     subparsers = parser.add_subparsers(help='sub-command help', required=True, dest='subcommand')
 
-    parser_pieces = subparsers.add_parser('pieces', help='pieces help')
-    parser_pieces.add_argument('--substring', help='Substring match. Without, it generates everything')
-
-
-    parser_art = subparsers.add_parser('art', help='art help')
-    parser_art.add_argument('--substring', help='Substring match. Without, it generates everything')
-
-    parser_camps = subparsers.add_parser('camps', help='camps help')
-    parser_camps.add_argument('--substring', help='Substring match. Without, it generates everything')
+    # Where the camps and art come from
+    sheets = argparse.ArgumentParser(add_help=False)
+    sheets.add_argument('--camps-csv', default=CAMPS_CSV, metavar='PATH', help=f'Placement export to read camps from (default {CAMPS_CSV})')
+    sheets.add_argument('--art-csv', default=ART_CSV, metavar='PATH', help=f'Export to read art from (default {ART_CSV})')
+    sheets.add_argument('--workbook', metavar='PATH',
+                        help='Read camps and art straight from the downloaded .xlsx or .ods instead of the two CSVs')
+
+    # How images are encoded
+    encoding = argparse.ArgumentParser(add_help=False)
+    encoding.add_argument('--format', choices=writer.FORMAT_NAMES, default='jpeg',
+                          help='Output format: jpeg (default), optimized png or lossless webp')
+    encoding.add_argument('--quality', type=int, default=100, help='JPEG quality. 100 for print, lower for quick previews')
+
+    tracing = argparse.ArgumentParser(add_help=False)
+    tracing.add_argument('--trace', metavar='PATH', help='Record where the run spends its time as a Chrome trace (open in ui.perfetto.dev)')
+
+    jobs = argparse.ArgumentParser(add_help=False)
+    jobs.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                      help=f'Work in N processes (this machine has {runner.default_jobs()} cores)')
+
+    asset_cache = argparse.ArgumentParser(add_help=False)
+    asset_cache.add_argument('--asset-cache', metavar='DIR', help='Keep resized sign/piece assets in DIR between runs')
+
+    # Options every render subcommand understands
+    common = argparse.ArgumentParser(add_help=False, parents=[sheets, encoding, tracing, jobs, asset_cache])
+    common.add_argument('--substring', help='Substring match. Without, it generates everything')
+    common.add_argument('--where', action='append', default=[], metavar='CONDITION',
+                        help='Only camps/art matching CONDITION, e.g. "fire", "sound_zone=SZ 3", "neighborhood=Riverside", "width>=50" (repeat to AND them)')
+    common.add_argument('--backend', choices=['pillow', 'svg'], default='pillow',
+                        help='pillow draws images in --format; svg writes vector SVGs with the fonts and assets embedded')
+    common.add_argument('--writer-threads', type=int, default=2, metavar='N',
+                        help='Threads encoding and writing images while the next one renders (0 writes inline)')
+    common.add_argument('--force', action='store_true', help='Re-render everything, even outputs the build manifest says are up to date')
+    common.add_argument('--scale', type=float, action='append', default=[], metavar='S',
+                        help='Also write every image at S times its normal size, into e.g. images_0.25x/ (repeatable)')
+    # What the options verify and serve don't take are left at, for the setup every subcommand shares
+    render_defaults = vars(common.parse_args([]))
+
+    parser_pieces = subparsers.add_parser('pieces', help='pieces help', parents=[common])
+
+    # Options for the sign subcommands
+    book = argparse.ArgumentParser(add_help=False)
+    book.add_argument('--book', metavar='PDF', help='Write the signs as pages of one PDF instead of separate images')
+    book.add_argument('--pages', type=page_ranges, metavar='RANGE',
+                      help='With --book, only these pages (counting from 1 in sheet order), e.g. 1-20,35')
+
+    parser_art = subparsers.add_parser('art', help='art help', parents=[common, book])
+
+    parser_camps = subparsers.add_parser('camps', help='camps help', parents=[common, book])
+
+    parser_impose = subparsers.add_parser('impose', help='Pack the map pieces onto printable pages at true scale', parents=[common])
+    parser_impose.add_argument('--output', default='print_sheets.pdf',
+                               help='A .pdf to write every page into, or a directory for one image per page (default print_sheets.pdf)')
+    parser_impose.add_argument('--page-size', choices=sorted(impose.PAGE_SIZES), default='letter')
+    parser_impose.add_argument('--dpi', type=int, default=72, help='Resolution of the pages')
+    parser_impose.add_argument('--feet-per-inch', type=float, default=72 / PIXELS_PER_FOOT,
+                               help='Map scale on paper (default matches the pieces at 72 DPI)')
+    parser_impose.add_argument('--margin', type=float, default=0.25, help='Page margin in inches')
+    parser_impose.add_argument('--gap', type=float, default=0.05, help='Space between pieces in inches')
+
+    parser_overview = subparsers.add_parser('overview', help='Every piece on one zoomable map, grouped by neighborhood', parents=[common])
+    parser_overview.add_argument('--output', default='overview', help='Writes OUTPUT.dzi and the OUTPUT_files/ tile pyramid (default overview)')
+    parser_overview.add_argument('--pixels-per-foot', type=float, default=PIXELS_PER_FOOT,
+                                 help=f'Resolution of the overview (pieces are {PIXELS_PER_FOOT})')
+    parser_overview.add_argument('--tile-size', type=int, default=overview.TILE_SIZE)
+
+    parser_verify = subparsers.add_parser('verify', help='Compare the renders against golden images', parents=[jobs, tracing])
+    parser_verify.set_defaults(**render_defaults)
+    parser_verify.add_argument('--substring', help='Only compare images whose golden path contains this')
+    parser_verify.add_argument('--pair', nargs=2, action='append', metavar=('GOLDEN_DIR', 'OUTPUT_DIR'),
+                               help='Directories to compare (default images_before vs images and sign_images_before vs sign_images)')
+    parser_verify.add_argument('--tolerance', type=int, default=0,
+                               help='How far (0-255) any channel of a pixel can be off before it counts as incorrect')
+    parser_verify.add_argument('--max-pixels', type=int, default=0, help='How many incorrect pixels an image is allowed')
+    parser_verify.add_argument('--diff-dir', default='verify_diffs', help='Where to write a diff image for each mismatch')
+
+    parser_serve = subparsers.add_parser('serve', help='Render pieces and signs on request over HTTP, on localhost only',
+                                         parents=[sheets, encoding, asset_cache, tracing])
+    parser_serve.set_defaults(**render_defaults)
+    parser_serve.add_argument('--port', type=int, default=server.DEFAULT_PORT)
+
+    parser_watch = subparsers.add_parser('watch', help='Keep running and re-render whatever a change to the sheets, fonts or assets affects', parents=[common])
 
     args = parser.parse_args()
+    if args.workbook:
+        # The readers take a workbook wherever they take a CSV, and only parse it once for both
+        args.camps_csv = args.art_csv = args.workbook
 
     import sys
 
-    if args.subcommand == 'art': 
-        print('art')
-        with timing("reading csv", debug=DEBUG):
-            arts = read_art_csv()
-        with timing("doing all images", debug=DEBUG):
-            main_art(arts, args.substring)
-        sys.exit(0)
-
-    camps = read_csv()
-    if args.subcommand == 'pieces':
-        for i, camp in enumerate(camps):
-            if args.substring and args.substring.lower() not in camp.name.lower():
-                continue
-            # TODO handle tiny camps
-            if camp.is_tiny():
-                print(f"Skipping {camp} because their frontage is too small for now.")
-                continue
-
-            img = gen_image_for_camp(camp)
-            # img.show()
-            with open(camp.to_filename('images'), 'w') as f:
-                img.save(f, subsampling=0, quality=100)
-    else: # camps
-        print('camps')
-        assert args.subcommand == 'camps'
-        for i, camp in enumerate(camps):
-            if args.substring and args.substring.lower() not in camp.name.lower():
-                continue
-
-            img = gen_sign_for_camp(camp)
-            with open(camp.to_filename('sign_images', suffix="_sign"), 'w') as f:
-                img.save(f, subsampling=0, quality=100)
+    configure_from_args(args)
 
+    try:
+        with timing(args.subcommand, cat='run'):
+            status = run_subcommand(args)
+    finally:
+        if args.trace:
+            tracer.write(args.trace)
+            print(f'Wrote trace to {args.trace}')
+    sys.exit(status)
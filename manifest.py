@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from enum import Enum
+from typing import Dict, Iterable, List, Optional
+
+MANIFEST_PATH = './build_manifest.json'
+
+# Anything that changes how *every* output looks. Editing these rebuilds everything.
+RENDERER_SOURCES = [
+    './main.py',
+    './datastore.py',
+    './workbook.py',
+    './writer.py',
+    './displaylist.py',
+    './textfit.py',
+    './tiles.py',
+    './glyphs.py',
+    './fonts.py',
+    './assets.py',
+    './svgbackend.py',
+    './rules.py',
+]
+
+_file_digests: Dict[str, str] = {}
+
+
+def file_digest(path):
+    "Content hash of a file. Memoized since the same fonts/assets feed every output."
+    if path not in _file_digests:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        _file_digests[path] = h.hexdigest()
+    return _file_digests[path]
+
+
+def forget_file_digest(path):
+    "For long running processes: call when a file changes so the next fingerprint re-reads it."
+    for known in list(_file_digests):
+        if os.path.normpath(known) == os.path.normpath(path):
+            del _file_digests[known]
+
+
+def _json_default(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f'Cannot fingerprint {value!r}')
+
+
+def fingerprint(inputs: dict, files: Iterable[str]) -> str:
+    """
+    Hash of everything that goes into one output: the parsed row fields and
+    rule results in `inputs`, plus the contents of the asset/font `files` it uses.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(inputs, sort_keys=True, default=_json_default).encode('utf-8'))
+    for path in sorted(set(files) | set(RENDERER_SOURCES)):
+        h.update(f'\0{path}\0{file_digest(path)}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+class Manifest(object):
+    """
+    Remembers the fingerprint each output file was rendered from, so a run can
+    skip outputs that wouldn't change. One manifest file holds a section per
+    output directory (images, sign_images, ...).
+
+    An entry is keyed by its output and also lists every file written with it
+    (e.g. the --scale copies), so losing any of them means a re-render.
+    """
+
+    def __init__(self, section, path=MANIFEST_PATH):
+        self.section = section
+        self.path = path
+        self._all = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self._all = json.load(f)
+        self.entries: Dict[str, dict] = self._all.setdefault(section, {})
+
+    def files(self, output) -> List[str]:
+        entry = self.entries.get(output)
+        # Manifests from before entries listed their files only had the fingerprint
+        return entry['files'] if isinstance(entry, dict) else [output]
+
+    def is_current(self, output, digest):
+        entry = self.entries.get(output)
+        return (isinstance(entry, dict) and entry['digest'] == digest
+                and all(os.path.exists(path) for path in entry['files']))
+
+    def record(self, output, digest, files: Optional[Iterable[str]] = None):
+        "`files` is everything written for this output, by default just the output itself."
+        self.entries[output] = {'digest': digest, 'files': list(files) if files is not None else [output]}
+
+    def forget(self, output):
+        self.entries.pop(output, None)
+
+    def prune(self, keep: Iterable[str]) -> List[str]:
+        "Deletes outputs this manifest made that aren't in `keep` (e.g. camps that left the sheet)."
+        keep = set(keep)
+        removed = []
+        for output in sorted(set(self.entries) - keep):
+            for path in self.files(output):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.forget(output)
+            removed.append(output)
+        return removed
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._all, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
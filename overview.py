@@ -0,0 +1,141 @@
+import math
+import os
+from typing import Callable, Iterable, List, NamedTuple, Sequence, Tuple
+from PIL import Image
+from cache import LRUCache
+import impose
+
+white = '#FFFFFF'
+
+TILE_SIZE = 512
+
+
+class Item(NamedTuple):
+    "Something drawn on the overview: a camp piece, or a neighborhood's heading."
+    kind: str
+    value: object
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class Layout(NamedTuple):
+    width: int
+    height: int
+    items: List[Item]
+
+
+def layout_groups(groups: Sequence[Tuple[str, Sequence]], size_of: Callable, heading_height: int, gap: int) -> Layout:
+    """
+    Stacks the groups (e.g. neighborhoods) top to bottom. Each group gets a heading
+    strip and its pieces shelf packed underneath, all groups sharing one width that
+    keeps the whole thing roughly square.
+    """
+    sizes = {id(thing): size_of(thing) for _, things in groups for thing in things}
+    total_area = sum((w + gap) * (h + gap) for w, h in sizes.values())
+    widest = max((w for w, _ in sizes.values()), default=1)
+    width = max(widest, math.ceil(math.sqrt(total_area)))
+
+    items = []
+    y = 0
+    for name, things in groups:
+        if not things:
+            continue
+        items.append(Item('heading', name, 0, y, width, heading_height))
+        y += heading_height + gap
+        page, = impose.pack(things, lambda thing: sizes[id(thing)], width, 1 << 30, gap)
+        for placement in page.placements:
+            items.append(Item('piece', placement.item, placement.x, y + placement.y, placement.width, placement.height))
+        y = max(item.y + item.height for item in items) + 2 * gap
+    return Layout(width, max(y - 2 * gap, 1), items)
+
+
+class _TileIndex(object):
+    "Which items touch which tile, so each tile only looks at its own handful of items."
+
+    def __init__(self, items: Iterable[Item], tile_size: int):
+        self.tile_size = tile_size
+        self.buckets = {}
+        for item in items:
+            for row in range(item.y // tile_size, (item.y + item.height - 1) // tile_size + 1):
+                for column in range(item.x // tile_size, (item.x + item.width - 1) // tile_size + 1):
+                    self.buckets.setdefault((column, row), []).append(item)
+
+    def items_at(self, column, row):
+        return self.buckets.get((column, row), [])
+
+
+def _level_count(width, height):
+    return math.ceil(math.log2(max(width, height, 1))) + 1
+
+
+def write_tiles(layout: Layout, render: Callable[[Item], Image.Image], output_dir: str,
+                tile_size=TILE_SIZE, tile_format='jpg', cache_bytes=64 * 1024 * 1024) -> str:
+    """
+    Writes the overview as a Deep Zoom image (`<output_dir>.dzi` plus `<output_dir>_files/`),
+    which OpenSeadragon and friends can pan and zoom.
+
+    Nothing ever holds the full canvas: the full resolution level is drawn a tile at
+    a time (rendered items are kept in a small LRU, since an item usually spans a
+    few neighbouring tiles), and every smaller level is built from the four tiles
+    under it, read back from disk. Peak memory is a few tiles plus the item cache.
+    """
+    levels = _level_count(layout.width, layout.height)
+    files_dir = f'{output_dir}_files'
+    save_options = {'quality': 90} if tile_format == 'jpg' else {}
+
+    def tile_path(level, column, row):
+        return os.path.join(files_dir, str(level), f'{column}_{row}.{tile_format}')
+
+    def level_size(level):
+        scale = 2 ** (levels - 1 - level)
+        return max(1, math.ceil(layout.width / scale)), max(1, math.ceil(layout.height / scale))
+
+    def tile_box(level, column, row):
+        width, height = level_size(level)
+        left, top = column * tile_size, row * tile_size
+        return left, top, min(left + tile_size, width), min(top + tile_size, height)
+
+    # Full resolution
+    rendered = LRUCache(cache_bytes, weigh=lambda img: img.width * img.height * 3)
+    index = _TileIndex(layout.items, tile_size)
+    top_level = levels - 1
+    os.makedirs(os.path.join(files_dir, str(top_level)), exist_ok=True)
+    columns, rows = math.ceil(layout.width / tile_size), math.ceil(layout.height / tile_size)
+    for row in range(rows):
+        for column in range(columns):
+            left, top, right, bottom = tile_box(top_level, column, row)
+            tile = Image.new('RGB', (right - left, bottom - top), white)
+            for item in index.items_at(column, row):
+                img = rendered.get_or_create(id(item), lambda: render(item))
+                tile.paste(img, (item.x - left, item.y - top))
+            tile.save(tile_path(top_level, column, row), **save_options)
+
+    # Every other level, halving each time
+    for level in range(top_level - 1, -1, -1):
+        os.makedirs(os.path.join(files_dir, str(level)), exist_ok=True)
+        width, height = level_size(level)
+        child_columns = math.ceil(level_size(level + 1)[0] / tile_size)
+        child_rows = math.ceil(level_size(level + 1)[1] / tile_size)
+        for row in range(math.ceil(height / tile_size)):
+            for column in range(math.ceil(width / tile_size)):
+                left, top, right, bottom = tile_box(level, column, row)
+                combined = Image.new('RGB', (2 * tile_size, 2 * tile_size), white)
+                for dy in (0, 1):
+                    for dx in (0, 1):
+                        child = (2 * column + dx, 2 * row + dy)
+                        if child[0] < child_columns and child[1] < child_rows:
+                            with Image.open(tile_path(level + 1, *child)) as child_tile:
+                                combined.paste(child_tile, (dx * tile_size, dy * tile_size))
+                tile = combined.resize((tile_size, tile_size), Image.LANCZOS).crop((0, 0, right - left, bottom - top))
+                tile.save(tile_path(level, column, row), **save_options)
+
+    dzi_path = f'{output_dir}.dzi'
+    with open(dzi_path, 'w') as f:
+        f.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{tile_format}" Overlap="0" TileSize="{tile_size}">\n'
+            f'  <Size Width="{layout.width}" Height="{layout.height}"/>\n'
+            '</Image>\n')
+    return dzi_path
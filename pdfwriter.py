@@ -0,0 +1,106 @@
+from io import BytesIO
+from typing import NamedTuple
+
+
+class EncodedPage(NamedTuple):
+    "A page image already JPEG compressed, ready to go in a PdfWriter."
+    jpeg: bytes
+    width: int
+    height: int
+    mode: str                   # 'RGB' or 'L'
+
+
+def encode_page(img, quality=95) -> EncodedPage:
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    encoded = BytesIO()
+    img.save(encoded, format='JPEG', quality=quality, subsampling=0)
+    return EncodedPage(encoded.getvalue(), img.width, img.height, img.mode)
+
+
+class PdfWriter(object):
+    """
+    Writes a PDF one full-page image at a time, straight to disk.
+
+    Pillow's own PDF saving wants every page up front (or re-parses the whole file
+    to append), so this writes the objects itself: each page is JPEG compressed,
+    written, and forgotten. Only the byte offsets are kept until close().
+    """
+
+    CATALOG = 1
+    PAGES = 2
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._offsets = {}
+        self._page_ids = []
+        self._next_id = 3
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write_object(self, object_id, body: bytes, stream: bytes = None):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f'{object_id} 0 obj\n'.encode('ascii'))
+        self._file.write(body)
+        if stream is not None:
+            self._file.write(b'\nstream\n')
+            self._file.write(stream)
+            self._file.write(b'\nendstream')
+        self._file.write(b'\nendobj\n')
+
+    def _new_id(self):
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    def add_page(self, img, dpi=300, quality=95):
+        "Adds `img` as a page of its own, sized so the image prints at `dpi`."
+        return self.add_jpeg(encode_page(img, quality), dpi)
+
+    def add_jpeg(self, page: EncodedPage, dpi=300):
+        "Adds an already encoded page, e.g. one a worker process compressed."
+        jpeg = page.jpeg
+        colorspace = '/DeviceRGB' if page.mode == 'RGB' else '/DeviceGray'
+
+        width_pt = page.width * 72 / dpi
+        height_pt = page.height * 72 / dpi
+        image_id, content_id, page_id = self._new_id(), self._new_id(), self._new_id()
+
+        self._write_object(image_id, (
+            f'<< /Type /XObject /Subtype /Image /Width {page.width} /Height {page.height} '
+            f'/ColorSpace {colorspace} /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>'
+        ).encode('ascii'), jpeg)
+        content = f'q {width_pt:.4f} 0 0 {height_pt:.4f} 0 0 cm /Im0 Do Q'.encode('ascii')
+        self._write_object(content_id, f'<< /Length {len(content)} >>'.encode('ascii'), content)
+        self._write_object(page_id, (
+            f'<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {width_pt:.4f} {height_pt:.4f}] '
+            f'/Resources << /XObject << /Im0 {image_id} 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('ascii'))
+        self._page_ids.append(page_id)
+        return len(jpeg)
+
+    @property
+    def page_count(self):
+        return len(self._page_ids)
+
+    def close(self):
+        if self._file.closed:
+            return
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self._page_ids)
+        self._write_object(self.PAGES, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>'.encode('ascii'))
+        self._write_object(self.CATALOG, f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode('ascii'))
+
+        xref_offset = self._file.tell()
+        count = self._next_id
+        lines = [f'xref\n0 {count}\n', '0000000000 65535 f \n']
+        for object_id in range(1, count):
+            lines.append(f'{self._offsets[object_id]:010d} 00000 n \n')
+        lines.append(f'trailer\n<< /Size {count} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n')
+        self._file.write(''.join(lines).encode('ascii'))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
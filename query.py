@@ -0,0 +1,177 @@
+import bisect
+import enum
+import re
+import typing
+from typing import Dict, Iterable, List, NamedTuple, Set, Tuple
+from datastore import NEIGHBORHOODS, Placeable
+
+# Friendlier names for some of the fields
+FIELD_ALIASES = {
+    'frontage': 'width',
+    'depth': 'height',
+    'rvs': 'rv_count',
+    'sz': 'sound_zone',
+    'neighborhood': 'neighborhood_preference',
+    'interactivity': 'interactivity_time',
+}
+# Values that can be given by their long name, e.g. neighborhood=Riverside for RS
+VALUE_ALIASES = {
+    'neighborhood_preference': {name.lower(): code.lower() for code, name in NEIGHBORHOODS.items()},
+}
+TRUE_WORDS = ('yes', 'true', 'y', '1')
+FALSE_WORDS = ('no', 'false', 'n', '0')
+
+CLAUSE = re.compile(r'^\s*(!?)\s*([A-Za-z_]+)\s*(?:(<=|>=|!=|=|<|>)\s*(.*?))?\s*$')
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Clause(NamedTuple):
+    "One --where condition, e.g. fire, sound_zone=SZ 3 or width>=50."
+    field: str
+    op: str                     # '=', '!=', '<', '<=', '>', '>=', or '' for a bare yes/no field
+    values: Tuple[str, ...]     # alternatives, any of which will do
+    negate: bool = False
+
+
+def parse_clause(text: str) -> Clause:
+    """
+    `field` or `!field` for yes/no fields, `field=a,b` for any of several values
+    (`field!=a,b` for none of them), and `<`, `<=`, `>`, `>=` or `=low..high` for numbers.
+    """
+    match = CLAUSE.match(text)
+    if not match:
+        raise QueryError(f'Cannot read --where {text!r}, try e.g. "fire", "sound_zone=SZ 3" or "width>=50"')
+    bang, field, op, value = match.groups()
+    field = FIELD_ALIASES.get(field.lower(), field.lower())
+    values = tuple(part.strip() for part in value.split(',')) if op else ()
+    return Clause(field, op or '', values, negate=bool(bang))
+
+
+def _field_types(kind) -> Dict[str, type]:
+    hints = typing.get_type_hints(kind.__init__)
+    return {field: hints[field] for field in kind.FIELDS}
+
+
+def _is_tuple(t):
+    return getattr(t, '__origin__', None) in (tuple, Tuple)
+
+
+class Index(object):
+    """
+    The parsed camps (or art) with an index per field, built once after loading:
+    value -> rows for the yes/no, enum, text and list fields (a camp is under each
+    of its neighborhoods and each of its interactivity times), and a sorted list for
+    the numbers so ranges are a bisect. select() intersects the rows each clause
+    picks, smallest first, rather than testing every clause against every row.
+    """
+
+    def __init__(self, things: Iterable[Placeable], kind):
+        self.things = list(things)
+        self.kind = kind
+        self.types = _field_types(kind)
+        self.everything = set(range(len(self.things)))
+        self.values: Dict[str, Dict[object, Set[int]]] = {field: {} for field in self.types}
+        self.ordered: Dict[str, List[Tuple[int, int]]] = {}
+
+        for row, thing in enumerate(self.things):
+            for field, field_type in self.types.items():
+                for key in self._keys(field_type, getattr(thing, field)):
+                    self.values[field].setdefault(key, set()).add(row)
+        for field, field_type in self.types.items():
+            if field_type is int:
+                self.ordered[field] = sorted((value, row) for value, rows in self.values[field].items() for row in rows)
+
+    @staticmethod
+    def _keys(field_type, value):
+        if isinstance(field_type, type) and issubclass(field_type, enum.Flag):
+            return [flag for flag in field_type if flag.value and flag in value]
+        if _is_tuple(field_type):
+            return [str(item).lower() for item in value]
+        if isinstance(value, str):
+            return [value.strip().lower()]
+        return [value]
+
+    def _field(self, clause: Clause):
+        if clause.field not in self.types:
+            raise QueryError(f'{self.kind.__name__} has no field {clause.field!r}, try one of: {", ".join(self.types)}')
+        return self.types[clause.field]
+
+    def _keys_for(self, clause: Clause, field_type, value: str) -> List[object]:
+        "The index keys one value in a clause stands for."
+        wanted = value.lower()
+        if field_type is bool:
+            if wanted in TRUE_WORDS:
+                return [True]
+            if wanted in FALSE_WORDS:
+                return [False]
+            raise QueryError(f'{clause.field} is yes or no, not {value!r}')
+        if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+            # By value as it's written in the sheet, or by name: 'Late Night' or late_night.
+            # A flag's empty member isn't something a camp can be "in".
+            candidates = [member for member in field_type if member.value or not issubclass(field_type, enum.Flag)]
+            members = [member for member in candidates
+                       if wanted in (member.name.lower(), member.name.lower().replace('_', ' '), str(member.value).lower())]
+            if not members:
+                choices = [str(member.value) if isinstance(member.value, str) else member.name.lower()
+                           for member in candidates]
+                raise QueryError(f'{value!r} is not one of the {clause.field} values: {", ".join(choices)}')
+            return members
+        if field_type is int:
+            try:
+                return [int(value)]
+            except ValueError:
+                raise QueryError(f'{clause.field} is a number, not {value!r}') from None
+        return [VALUE_ALIASES.get(clause.field, {}).get(wanted, wanted)]
+
+    def _range(self, field, low, high) -> Set[int]:
+        "Rows with low <= field <= high."
+        ordered = self.ordered[field]
+        start = bisect.bisect_left(ordered, (low, -1))
+        end = bisect.bisect_right(ordered, (high, len(self.things)))
+        return {row for _, row in ordered[start:end]}
+
+    def rows(self, clause: Clause) -> Set[int]:
+        field_type = self._field(clause)
+        index = self.values[clause.field]
+
+        if clause.op == '':
+            if field_type is not bool:
+                raise QueryError(f'{clause.field} is not a yes/no field, give it a value, e.g. {clause.field}=...')
+            rows = set(index.get(True, ()))
+        elif clause.op in ('<', '<=', '>', '>='):
+            if field_type is not int or len(clause.values) != 1:
+                raise QueryError(f'{clause.field}{clause.op} only works with a single number')
+            limit = self._keys_for(clause, field_type, clause.values[0])[0]
+            low, high = {'<': (float('-inf'), limit - 1), '<=': (float('-inf'), limit),
+                         '>': (limit + 1, float('inf')), '>=': (limit, float('inf'))}[clause.op]
+            rows = self._range(clause.field, low, high)
+        else:
+            rows = set()
+            for value in clause.values:
+                if field_type is int and '..' in value:
+                    low, _, high = value.partition('..')
+                    rows |= self._range(clause.field, self._keys_for(clause, int, low)[0], self._keys_for(clause, int, high)[0])
+                    continue
+                for key in self._keys_for(clause, field_type, value):
+                    rows |= index.get(key, set())
+            if clause.op == '!=':
+                rows = self.everything - rows
+
+        return self.everything - rows if clause.negate else rows
+
+    def select(self, clauses: Iterable[Clause]) -> List[Placeable]:
+        "Everything matching all the clauses, in sheet order."
+        picked = sorted((self.rows(clause) for clause in clauses), key=len)
+        rows = set.intersection(*picked) if picked else self.everything
+        return [self.things[row] for row in sorted(rows)]
+
+
+def where(things: Iterable[Placeable], kind, conditions: Iterable[str]) -> List[Placeable]:
+    "The things matching every --where condition."
+    clauses = [parse_clause(condition) for condition in conditions]
+    if not clauses:
+        return list(things)
+    return Index(things, kind).select(clauses)
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import re
+from threading import Lock
+from typing import Dict, List, Optional
+
+RULES_PATH = './rules.json'
+# Which rules matched which names, kept between runs for as long as rules.json doesn't change
+CACHE_PATH = './.rules_cache.json'
+
+# What each section of the rules file is for. Every rule has a "match": a piece of
+# the name as it is in the sheet, ignoring case. The first rule in a section that
+# matches wins.
+CATEGORIES = {
+    'piece_names': 'shorter names for the map pieces: {"match": ..., "name": ...}',
+    'camp_sign_names': 'what a camp sign says instead of the name: {"match": ..., "name": ...}',
+    'art_sign_names': 'what an art sign says instead of the name: {"match": ..., "name": ...}',
+    'sign_sizes': 'pinned font size and wrap width for a sign name that measuring gets wrong: {"match": ..., "size": ..., "break": ...}',
+}
+
+
+class RulesError(ValueError):
+    pass
+
+
+class RuleTable(object):
+    """
+    Every rule from the rules file compiled into one pattern, with a group per rule
+    named after its section. Matching a name once says which rules in every section
+    apply, and the answer is remembered for the next piece or sign with that name
+    (and, through save_cache(), the next run with the same rules file).
+    """
+
+    def __init__(self, rules: Dict[str, List[dict]], digest: str = ''):
+        unknown = set(rules) - set(CATEGORIES)
+        if unknown:
+            raise RulesError(f'Unknown rules section(s) {", ".join(sorted(unknown))}, expected {", ".join(CATEGORIES)}')
+        self.rules = {category: list(rules.get(category, [])) for category in CATEGORIES}
+
+        lookaheads = []
+        self._groups = {}
+        for category, category_rules in self.rules.items():
+            self._groups[category] = []
+            for i, rule in enumerate(category_rules):
+                if not rule.get('match'):
+                    raise RulesError(f'{category} rule {i} has nothing to match: {rule!r}')
+                group = f'{category}_{i}'
+                self._groups[category].append(group)
+                # Optional lookaheads all anchored at the start, so one match() finds every rule in the name
+                lookaheads.append(f'(?=.*?(?P<{group}>{re.escape(rule["match"].lower())}))?')
+        self.pattern = re.compile(''.join(lookaheads), re.DOTALL)
+        self.digest = digest
+        # name -> index of the winning rule (or None) in each section
+        self.matches: Dict[str, Dict[str, Optional[int]]] = {}
+        self.unsaved = False
+
+    def resolve(self, name: str) -> Dict[str, Optional[dict]]:
+        "The winning rule (or None) in each section for `name`."
+        if name not in self.matches:
+            self.matches[name] = self._match(name)
+            self.unsaved = True
+        return {category: None if i is None else self.rules[category][i]
+                for category, i in self.matches[name].items()}
+
+    def _match(self, name):
+        matched = self.pattern.match(name.lower())
+        return {category: next((i for i, group in enumerate(groups) if matched.group(group) is not None), None)
+                for category, groups in self._groups.items()}
+
+    def remember(self, matches: Dict[str, Dict[str, Optional[int]]]):
+        "Takes on what an earlier run with the same rules worked out."
+        for name, found in matches.items():
+            if set(found) == set(CATEGORIES):
+                self.matches.setdefault(name, found)
+
+    def name(self, category, name: str) -> str:
+        rule = self.resolve(name)[category]
+        return rule['name'] if rule else name
+
+    def sign_size(self, name: str) -> Optional[dict]:
+        rule = self.resolve(name)['sign_sizes']
+        return {'size': rule['size'], 'break': rule['break']} if rule else None
+
+
+def load(path=RULES_PATH, cache_path=CACHE_PATH) -> RuleTable:
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        rules = json.loads(data.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise RulesError(f'{path} is not valid JSON: {e}') from e
+    table = RuleTable(rules, hashlib.sha256(data).hexdigest())
+    table.remember(_read_cache(cache_path, table.digest))
+    return table
+
+
+def _read_cache(cache_path, digest):
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Any edit to the rules file and the whole cache is stale
+    if not isinstance(cached, dict) or cached.get('digest') != digest:
+        return {}
+    return cached.get('matches') or {}
+
+
+_table: Optional[RuleTable] = None
+_table_lock = Lock()
+
+
+def get_rules() -> RuleTable:
+    "The rules file, loaded and compiled the first time it's needed in this process."
+    global _table
+    with _table_lock:
+        if _table is None:
+            _table = load()
+        return _table
+
+
+def save_cache(cache_path=CACHE_PATH):
+    "Keeps this run's matches for the next one. Nothing to do if no new names came up."
+    with _table_lock:
+        if _table is None or not _table.unsaved:
+            return
+        partial = f'{cache_path}.partial'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump({'digest': _table.digest, 'matches': _table.matches}, f)
+        os.replace(partial, cache_path)
+        _table.unsaved = False
+
+
+def clear():
+    "For long running processes: call when the rules file changes."
+    global _table
+    with _table_lock:
+        _table = None
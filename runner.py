@@ -0,0 +1,184 @@
+import os
+import traceback
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+from typing import Callable, Iterable, List, NamedTuple, Optional
+import timing
+
+
+class RenderResult(NamedTuple):
+    item: object
+    value: object = None
+    error: Optional[str] = None
+    seconds: float = 0.0        # in fn, i.e. rendering
+    waited: float = 0.0         # then waiting on the Future fn handed back (e.g. the image write)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class _Started(NamedTuple):
+    item: object
+    seconds: float
+    value: object = None
+    error: Optional[str] = None
+
+
+def _start(fn, item) -> _Started:
+    # One bad camp shouldn't take the rest of the run down with it,
+    # so the traceback is kept as text instead of being raised.
+    start = perf_counter()
+    try:
+        value = fn(item)
+    except Exception:
+        return _Started(item, perf_counter() - start, error=traceback.format_exc())
+    return _Started(item, perf_counter() - start, value=value)
+
+
+def _finish(started: _Started) -> RenderResult:
+    """
+    fn may hand back a Future (e.g. a queued image write); wait for it here. Only the
+    time actually spent blocked on it counts as waited, the Future may well have
+    finished while the next items were rendering.
+    """
+    value, error = started.value, started.error
+    waited = 0.0
+    if error is None and isinstance(value, Future):
+        start = perf_counter()
+        try:
+            value = value.result()
+        except Exception:
+            value, error = None, traceback.format_exc()
+        waited = perf_counter() - start
+    return RenderResult(started.item, value=value, error=error, seconds=started.seconds, waited=waited)
+
+
+def _run_in_order(fn, items, window) -> Iterable[RenderResult]:
+    # Keeps up to `window` items in flight so their futures can resolve in the
+    # background while the next ones are being worked on.
+    in_flight = deque()
+    for item in items:
+        in_flight.append(_start(fn, item))
+        if len(in_flight) > window:
+            yield _finish(in_flight.popleft())
+    while in_flight:
+        yield _finish(in_flight.popleft())
+
+
+def _run_chunk(fn, window, chunk):
+    # Trace spans recorded in the worker ride back with the results.
+    results = list(_run_in_order(fn, chunk, window))
+    return results, timing.tracer.drain()
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def chunk_size(count, jobs):
+    # A few chunks per worker keeps them all busy without paying pickling overhead per item.
+    return max(1, count // (jobs * 4))
+
+
+class WorkerPool(object):
+    """
+    A process pool that outlives a single run(), for long running processes (watch)
+    that would otherwise start and warm up a new set of workers for every rebuild.
+    The workers keep their own caches, so restart() the pool when those go stale.
+    """
+
+    def __init__(self, jobs, initializer=None, initargs=()):
+        self.jobs = jobs
+        self.initializer = initializer
+        self.initargs = initargs
+        self._executor = None
+
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=self.initializer,
+                                                 initargs=self.initargs)
+        return self._executor
+
+    def restart(self):
+        "The next run gets fresh workers."
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+def run(fn: Callable, items: Iterable, jobs: int = 1, initializer=None, initargs=(), window=2,
+        size=None, max_pending=None, pool: Optional[WorkerPool] = None) -> Iterable[RenderResult]:
+    """
+    Calls fn(item) for every item, yielding RenderResults in the same order as `items`.
+
+    fn can return a Future instead of a value; the result waits for it, with up to
+    `window` items in flight at once. With jobs > 1 the work is spread over a process
+    pool in chunks (of `size` items, if given). fn, the items and the return values
+    all have to be picklable. `initializer` is run once in each worker (and once up
+    front when running serially) to set up per-process state.
+
+    With max_pending, no more than that many chunks are queued or finished but not
+    yet yielded, for when the results are big and the caller is slow to take them.
+
+    With a `pool` (and jobs > 1) its workers are used instead of starting new ones,
+    and they've already been set up by the pool's own initializer.
+    """
+    items = list(items)
+
+    if jobs <= 1 or len(items) <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from _run_in_order(fn, items, window)
+        return
+
+    jobs = min(jobs, len(items))
+    size = size or chunk_size(len(items), jobs)
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    if pool is not None:
+        yield from _run_chunks(pool.executor(), fn, chunks, window, max_pending)
+        return
+    with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as executor:
+        yield from _run_chunks(executor, fn, chunks, window, max_pending)
+
+
+def _run_chunks(executor, fn, chunks, window, max_pending):
+    if not max_pending:
+        finished = executor.map(partial(_run_chunk, fn, window), chunks)
+    else:
+        finished = _bounded_map(executor, partial(_run_chunk, fn, window), chunks, max_pending)
+    for results, events in finished:
+        timing.tracer.extend(events)
+        yield from results
+
+
+def _bounded_map(executor, fn, chunks, max_pending):
+    "executor.map, but only ever max_pending chunks ahead of the caller."
+    pending = deque()
+    for chunk in chunks:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, chunk))
+    while pending:
+        yield pending.popleft().result()
+
+
+def print_summary(results: List[RenderResult], describe=repr) -> int:
+    "Prints every failure with its traceback and returns how many there were."
+    failures = [r for r in results if not r.ok]
+    rendering = sum(r.seconds for r in results)
+    waiting = sum(r.waited for r in results)
+    # Summed over every item, so with --jobs it's across all the workers
+    print(f'{len(results) - len(failures)} of {len(results)} rendered '
+          f'({rendering:.3f} seconds of render time, {waiting:.3f} seconds waiting on writes)')
+    if failures:
+        print(f'{len(failures)} failed:')
+        for result in failures:
+            print(f'--- {describe(result.item)}')
+            print(result.error.rstrip())
+    return len(failures)
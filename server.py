@@ -0,0 +1,222 @@
+import io
+import json
+import threading
+import traceback
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple
+from urllib.parse import parse_qs, unquote, urlsplit
+import writer
+from datastore import read_csv, read_art_csv, Placeable
+
+# Only ever bound to loopback: there's no auth, anyone who can reach it can render and re-upload.
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+
+CONTENT_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+}
+
+
+class Kind(NamedTuple):
+    "One kind of image the service can make: what it's made from and how."
+    collection: str                     # 'camps' or 'arts'
+    render: Callable                    # thing -> PIL image
+    filename: Callable                  # thing -> path it'd be saved under by main.py
+
+
+class NotFound(Exception):
+    pass
+
+
+class Catalog(object):
+    """
+    The parsed camps and art, swapped out wholesale when a new export is uploaded.
+    Readers always see one complete sheet or the other, never half of each.
+    """
+
+    def __init__(self, camps: List[Placeable], arts: List[Placeable]):
+        self._lock = threading.Lock()
+        self._things = {'camps': camps, 'arts': arts}
+
+    def all(self, collection) -> List[Placeable]:
+        with self._lock:
+            return self._things[collection]
+
+    def replace(self, collection, things):
+        with self._lock:
+            self._things[collection] = things
+
+    def find(self, collection, name) -> Placeable:
+        """
+        The camp/art called `name` (ignoring case), or failing that the only one whose
+        name contains it. Raises NotFound listing the candidates otherwise.
+        """
+        things = self.all(collection)
+        wanted = name.strip().lower()
+        exact = [thing for thing in things if thing.name.lower() == wanted]
+        if exact:
+            return exact[0]
+        partial = [thing for thing in things if wanted in thing.name.lower()]
+        if len(partial) == 1:
+            return partial[0]
+        if not partial:
+            raise NotFound(f'Nothing in {collection} is called {name!r}')
+        raise NotFound(f'{name!r} matches {len(partial)} {collection}: ' + ', '.join(thing.name for thing in partial))
+
+
+class RenderService(object):
+    """
+    Everything a request needs, kept warm between requests: the parsed sheets here,
+    and the fonts, assets, tiles and text fits in their own module caches.
+    """
+
+    def __init__(self, catalog: Catalog, kinds: Dict[str, Kind]):
+        self.catalog = catalog
+        self.kinds = kinds
+
+    def render(self, kind, thing) -> bytes:
+        return writer.image_writer.encode(self.kinds[kind].render(thing))
+
+    def batch(self, wanted) -> bytes:
+        """
+        A zip of every requested (kind, name), laid out like main.py lays out its
+        output directories. A name of '*' means all of that kind, skipping (and listing
+        in skipped.txt) any that can't be rendered, like camps too small for a piece.
+        """
+        out = io.BytesIO()
+        skipped = []
+        with zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED) as archive:
+            for kind, name in wanted:
+                collection = self.kinds[kind].collection
+                things = self.catalog.all(collection) if name == '*' else [self.catalog.find(collection, name)]
+                for thing in things:
+                    try:
+                        image = self.render(kind, thing)
+                    except ValueError as e:
+                        if name != '*':
+                            raise
+                        skipped.append(f'{kind} {thing.name}: {e}')
+                        continue
+                    # Already compressed images, deflating them again buys nothing.
+                    archive.writestr(self.kinds[kind].filename(thing), image)
+            if skipped:
+                archive.writestr('skipped.txt', '\n'.join(skipped) + '\n')
+        return out.getvalue()
+
+    def upload(self, collection, body: bytes) -> int:
+        text = io.StringIO(body.decode('utf-8-sig'), newline='')
+        things = read_csv(text) if collection == 'camps' else read_art_csv(text)
+        if not things:
+            # A header with nothing under it is a botched export, not an empty festival
+            raise ValueError('no rows under the header')
+        self.catalog.replace(collection, things)
+        return len(things)
+
+
+# URL path -> kind
+ROUTES = {
+    'piece': 'piece',
+    'sign/camp': 'camp sign',
+    'sign/art': 'art sign',
+}
+# query parameter on /batch -> kind
+BATCH_PARAMETERS = {
+    'piece': 'piece',
+    'camp': 'camp sign',
+    'art': 'art sign',
+}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /                      what's loaded, as JSON
+    GET  /piece/<camp>          one map piece
+    GET  /sign/camp/<camp>      one camp sign
+    GET  /sign/art/<art>        one art sign
+    GET  /batch?piece=A&camp=B&art=C   a zip of everything asked for (repeat any of them, * for all)
+    PUT  /csv/camps, /csv/art   replace the camps or art with the CSV in the request body
+    """
+    service: RenderService = None
+    server_version = 'soak-placement'
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path).strip('/')
+        try:
+            if path == '':
+                return self.send_json(200, {
+                    'camps': [camp.name for camp in self.service.catalog.all('camps')],
+                    'art': [art.name for art in self.service.catalog.all('arts')],
+                })
+            if path == 'batch':
+                query = parse_qs(url.query)
+                wanted = [(kind, name) for parameter, kind in BATCH_PARAMETERS.items() for name in query.get(parameter, [])]
+                if not wanted:
+                    return self.send_text(400, 'Ask for something, e.g. /batch?piece=Fire+Camp&camp=*')
+                return self.send_bytes(200, 'application/zip', self.service.batch(wanted),
+                                       {'Content-Disposition': 'attachment; filename="soak-placement.zip"'})
+            for prefix, kind in ROUTES.items():
+                if path.startswith(prefix + '/'):
+                    name = path[len(prefix) + 1:]
+                    thing = self.service.catalog.find(self.service.kinds[kind].collection, name)
+                    fmt = writer.image_writer.format
+                    return self.send_bytes(200, CONTENT_TYPES[fmt.name], self.service.render(kind, thing))
+            self.send_text(404, f'No such page {url.path}')
+        except NotFound as e:
+            self.send_text(404, str(e))
+        except ValueError as e:
+            # e.g. a camp too small to make a piece for
+            self.send_text(422, str(e))
+        except Exception:
+            self.send_text(500, traceback.format_exc())
+
+    def do_PUT(self):
+        path = unquote(urlsplit(self.path).path).strip('/')
+        collections = {'csv/camps': 'camps', 'csv/art': 'arts'}
+        if path not in collections:
+            return self.send_text(404, 'Upload to /csv/camps or /csv/art')
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        try:
+            count = self.service.upload(collections[path], body)
+        except (KeyError, ValueError, UnicodeDecodeError) as e:
+            # Missing columns, values we don't understand: the old sheet stays loaded.
+            return self.send_text(400, f'Could not read that CSV: {e!r}')
+        self.send_json(200, {'loaded': count})
+
+    do_POST = do_PUT
+
+    def send_bytes(self, status, content_type, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, status, text):
+        self.send_bytes(status, 'text/plain; charset=utf-8', (text.rstrip() + '\n').encode('utf-8'))
+
+    def send_json(self, status, value):
+        self.send_bytes(status, 'application/json', json.dumps(value, indent=2).encode('utf-8'))
+
+
+def make_server(service: RenderService, port=DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type('Handler', (RequestHandler,), {'service': service})
+    httpd = ThreadingHTTPServer((HOST, port), handler)
+    httpd.daemon_threads = True
+    return httpd
+
+
+def serve(service: RenderService, port=DEFAULT_PORT):
+    httpd = make_server(service, port)
+    print(f'Serving on http://{HOST}:{httpd.server_address[1]}/ , Ctrl-C to stop')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
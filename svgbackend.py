@@ -0,0 +1,122 @@
+import base64
+import functools
+import mimetypes
+import os
+from xml.sax.saxutils import escape, quoteattr
+import fonts
+from displaylist import DisplayList, Label, Picture, Ring
+
+# Pillow's default gap between lines of multiline_text, see textfit.LINE_SPACING
+LINE_SPACING = 4
+
+
+def font_family(font_path):
+    return os.path.splitext(os.path.basename(font_path))[0]
+
+
+@functools.lru_cache(maxsize=64)
+def _encoded(path, mtime):
+    "The file as a data: URI. Keyed on mtime too so an edited asset gets re-read."
+    kind = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    with open(path, 'rb') as f:
+        return f'data:{kind};base64,{base64.b64encode(f.read()).decode("ascii")}'
+
+
+def data_uri(path):
+    return _encoded(path, os.stat(path).st_mtime_ns)
+
+
+def _number(value):
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def _text_lines(text, x, y, width, height, font_path, size, align, fill):
+    """
+    <text> for a block of lines centered in the box the way multiline_text with
+    anchor='mm' centers them, using the same font metrics Pillow lays them out with.
+    """
+    font = fonts.get_font(font_path, size)
+    ascent, descent = font.getmetrics()
+    lines = text.split('\n')
+    line_spacing = font.getbbox('A')[3] + LINE_SPACING
+    block_width = max(font.getlength(line) for line in lines)
+    cx, cy = x + width / 2, y + height / 2
+
+    if align == 'right':
+        anchor, line_x = 'end', cx + block_width / 2
+    elif align == 'center':
+        anchor, line_x = 'middle', cx
+    else:
+        anchor, line_x = 'start', cx - block_width / 2
+
+    # Each line's 'm' anchor is halfway between its ascender and descender
+    first_baseline = cy - (len(lines) - 1) * line_spacing / 2 + (ascent - descent) / 2
+    spans = ''.join(
+        f'<tspan x="{_number(line_x)}" y="{_number(first_baseline + i * line_spacing)}">{escape(line)}</tspan>'
+        for i, line in enumerate(lines))
+    return (f'<text font-family={quoteattr(font_family(font_path))} font-size="{size}" fill={quoteattr(fill)} '
+            f'text-anchor="{anchor}" xml:space="preserve">{spans}</text>')
+
+
+def _label(label: Label):
+    box = (f'<rect width="{label.width}" height="{label.height}" fill={quoteattr(label.bg)}/>')
+    text = ''
+    if label.text:
+        text = _text_lines(label.text, 0, 0, label.width, label.height, label.font_path, label.size,
+                           label.align, label.color)
+    # A nested <svg> clips to its own box, like the separate image the text used to be drawn in
+    inner = f'<svg width="{label.width}" height="{label.height}">{box}{text}</svg>'
+    if label.rotate:
+        # A quarter turn clockwise about the top left, then back into place
+        return f'<g transform="translate({label.x + label.height} {label.y}) rotate(90)">{inner}</g>'
+    return f'<g transform="translate({label.x} {label.y})">{inner}</g>'
+
+
+def _picture(picture: Picture):
+    return (f'<image href={quoteattr(data_uri(picture.path))} x="{picture.x}" y="{picture.y}" '
+            f'width="{picture.width}" height="{picture.height}" preserveAspectRatio="none"/>')
+
+
+def _ring(ring: Ring):
+    r = ring.diameter / 2
+    font = fonts.get_font(ring.font_path, ring.size)
+    tl = (ring.diameter - ring.size) // 2
+    return (f'<g transform="translate({ring.x} {ring.y})">'
+            f'<rect width="{ring.diameter}" height="{ring.diameter}" fill={quoteattr(ring.bg)}/>'
+            f'<circle cx="{_number(r)}" cy="{_number(r)}" r="{_number(r - ring.line_width / 2)}" fill="none" '
+            f'stroke={quoteattr(ring.color)} stroke-width="{ring.line_width}"/>'
+            f'<text x="{tl}" y="{tl + font.getmetrics()[0]}" font-family={quoteattr(font_family(ring.font_path))} '
+            f'font-size="{ring.size}" fill={quoteattr(ring.color)}>{ring.number}</text></g>')
+
+
+def to_svg(display_list: DisplayList, scale=1.0) -> str:
+    """
+    The display list as a self-contained SVG document. Fonts and images are embedded
+    as data: URIs, so the file can be moved, mailed or opened anywhere. Each file is
+    encoded once per process and shared by every document that uses it.
+
+    `scale` only sets the SVG's intrinsic size, it's vector all the way down.
+    """
+    width, height = display_list.width, display_list.height
+    font_paths = sorted({op.font_path for op in display_list.ops if isinstance(op, (Label, Ring))})
+    font_faces = ''.join(
+        f"@font-face {{ font-family: '{font_family(path)}'; src: url('{data_uri(path)}'); }}"
+        for path in font_paths)
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{_number(width * scale)}" height="{_number(height * scale)}" '
+        f'viewBox="0 0 {width} {height}">',
+        f'<style>{font_faces}</style>',
+        f'<rect width="{width}" height="{height}" fill={quoteattr(display_list.background)}/>',
+    ]
+    if display_list.background_image:
+        parts.append(_picture(Picture(display_list.background_image, 0, 0, width, height)))
+    for op in display_list.ops:
+        if isinstance(op, Label):
+            parts.append(_label(op))
+        elif isinstance(op, Picture):
+            parts.append(_picture(op))
+        elif isinstance(op, Ring):
+            parts.append(_ring(op))
+    parts.append('</svg>')
+    return '\n'.join(parts)
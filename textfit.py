@@ -0,0 +1,141 @@
+import functools
+import math
+import textwrap
+from typing import List, Tuple
+from PIL import Image, ImageDraw
+import fonts
+from timing import span
+
+# Size each wrapping is measured at first, to estimate how big it could get
+REFERENCE_SIZE = 100
+# Pillow's default gap between lines of multiline_text
+LINE_SPACING = 4
+
+_scratch = ImageDraw.Draw(Image.new('L', (1, 1)))
+
+
+def wrap(text: str, width: int) -> List[str]:
+    "textwrap.wrap, except that a newline in `text` always starts a new line (e.g. one put in a name rule)."
+    return [line for part in text.split('\n') for line in textwrap.wrap(part.strip(), width)]
+
+
+def candidate_wraps(text: str) -> List[Tuple[int, List[str]]]:
+    """
+    Every distinct way wrap() can break `text` without splitting a word, as
+    (wrap width, lines) pairs from most lines to fewest.
+    """
+    words = text.split()
+    if not words:
+        return [(max(len(text), 1), [text])]
+    seen = set()
+    wraps = []
+    for width in range(max(len(word) for word in words), len(text) + 1):
+        lines = wrap(text, width)
+        key = tuple(lines)
+        if key not in seen:
+            seen.add(key)
+            wraps.append((width, lines))
+    return wraps
+
+
+def _room(lines, size, font_path, width, height, padding, align):
+    """
+    How much the text could be scaled around its anchor (the middle of the box) and still fit.
+    Over 1 means there's room to spare, under 1 means it doesn't fit.
+    """
+    cx, cy = width / 2, height / 2
+    left, top, right, bottom = _scratch.multiline_textbbox(
+        (cx, cy), '\n'.join(lines), font=fonts.get_font(font_path, size),
+        anchor='mm', align=align, spacing=LINE_SPACING)
+    room = math.inf
+    for available, used in ((cx - padding, cx - left), (width - padding - cx, right - cx),
+                            (cy - padding, cy - top), (height - padding - cy, bottom - cy)):
+        if used > 0:
+            room = min(room, available / used)
+    return room
+
+
+def _estimate(lines, font_path, width, height, padding, align):
+    "Roughly the biggest size these lines could be, scaled up from one measurement at REFERENCE_SIZE."
+    return REFERENCE_SIZE * _room(lines, REFERENCE_SIZE, font_path, width, height, padding, align)
+
+
+def _largest_size(lines, estimate, font_path, width, height, padding, align, min_size, max_size):
+    """
+    Biggest size in [min_size, max_size] these lines fit at, or None. Glyph boxes grow almost
+    linearly with the font size, so each measurement tells us roughly where to look next and
+    this settles in two or three measurements.
+    """
+    size = max(min_size, min(max_size, math.floor(estimate)))
+    best = None
+    tried = set()
+    while size not in tried and min_size <= size <= max_size:
+        tried.add(size)
+        room = _room(lines, size, font_path, width, height, padding, align)
+        if room >= 1:
+            best = size if best is None else max(best, size)
+            next_size = max(size + 1, math.floor(size * room))
+        else:
+            next_size = min(size - 1, math.floor(size * room))
+        next_size = max(min_size, min(max_size, next_size))
+        if best is not None and next_size <= best:
+            break
+        size = next_size
+    return best
+
+
+FitResult = Tuple[int, int]
+
+
+def fit_text(text: str, width: int, height: int, font_path: str, max_size: int, min_size: int = 1,
+             padding: int = 0, align: str = 'center', wrap: bool = True):
+    """
+    Finds the biggest font size (up to max_size) and textwrap width that fit `text`
+    inside a width x height box with `padding` to spare on every side, measuring the
+    real glyph bounding boxes. Returns {'size': ..., 'break': ...} like the old sizing
+    tables did. If nothing fits, you get min_size wrapped at the longest word.
+
+    Blank text fits at any size, so it gets max_size.
+
+    wrap=False only tries `text` as one line, for text that's drawn without wrapping.
+
+    Memoized, so re-fitting the same name into the same box is free. Every call gets
+    its own dict, the memo can't be changed through it.
+    """
+    size, break_at = _fit_memo(text, width, height, font_path, max_size, min_size, padding, align, wrap)
+    return {'size': size, 'break': break_at}
+
+
+@functools.lru_cache(maxsize=4096)
+def _fit_memo(text, width, height, font_path, max_size, min_size, padding, align, wrap) -> FitResult:
+    with span('fit text', 'fit', {'text': text, 'font': font_path}):
+        return _fit(text, width, height, font_path, max_size, min_size, padding, align, wrap)
+
+
+def clear():
+    "Forgets every fit, for when a font changes."
+    _fit_memo.cache_clear()
+
+
+def _fit(text, width, height, font_path, max_size, min_size, padding, align, wrap) -> FitResult:
+    if not text.strip():
+        return max_size, max(len(text), 1)
+    wraps = candidate_wraps(text) if wrap else [(len(text), [text])]
+    estimates = sorted(
+        ((_estimate(lines, font_path, width, height, padding, align), i) for i, (_, lines) in enumerate(wraps)),
+        reverse=True)
+
+    best_size, best_wrap, best_lines = min_size - 1, wraps[0][0], len(wraps[0][1])
+    for estimate, i in estimates:
+        wrap, lines = wraps[i]
+        if estimate * 1.05 + 2 <= best_size:
+            # Estimates are sorted, nothing after this can beat what we have.
+            break
+        size = _largest_size(lines, estimate, font_path, width, height, padding, align,
+                             max(min_size, best_size), max_size)
+        if size is None:
+            continue
+        if size > best_size or (size == best_size and len(lines) < best_lines):
+            best_size, best_wrap, best_lines = size, wrap, len(lines)
+
+    return max(best_size, min_size), best_wrap
@@ -0,0 +1,37 @@
+from cache import LRUCache
+from assets import _image_bytes
+
+# Labels are small, a few thousand of them fit in here with room to spare.
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class TileCache(object):
+    """
+    Finished label tiles (background, text and rotation all baked in) keyed by
+    everything that goes into drawing one: (text, colors, font, font size, box size,
+    rotation). The border bars, sound zone headers and dimension numbers are the
+    same handful of tiles on piece after piece, so each is drawn once and pasted
+    after that.
+
+    Tiles are shared, so paste them, don't draw on them.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.memory = LRUCache(max_bytes, weigh=_image_bytes)
+
+    def get(self, key, render):
+        "The tile for key, calling render() to draw it the first time."
+        return self.memory.get_or_create(key, render)
+
+    def stats(self):
+        return self.memory.stats()
+
+    def clear(self):
+        self.memory.clear()
+
+
+cache = TileCache()
+
+
+def get_tile(key, render):
+    return cache.get(key, render)
@@ -1,17 +1,139 @@
+import json
+import os
+import threading
+import time
 from time import perf_counter
-# via https://stackoverflow.com/questions/33987060/python-context-manager-that-measures-time
 
+
+class _Span(object):
+    __slots__ = ('tracer', 'name', 'cat', 'args', 'start')
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.tracer.add(self.name, self.cat, self.start, perf_counter(), self.args)
+
+
+class _NullSpan(object):
+    "What span() hands out while tracing is off. Does nothing, costs next to nothing."
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer(object):
+    """
+    Records nested spans as Chrome trace events (load the file in chrome://tracing
+    or ui.perfetto.dev). Nesting comes for free: spans on the same thread that sit
+    inside each other in time are drawn inside each other.
+
+    Timestamps are wall clock microseconds so events recorded in worker processes
+    line up with the parent's. Workers hand theirs back with drain() and the parent
+    merges them in with extend().
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.pid = None
+        self._offset = 0.0
+        self._named_threads = set()
+
+    def enable(self):
+        # A forked worker inherits the parent's events, which aren't its to send back.
+        if self.enabled and self.pid == os.getpid():
+            return
+        self.enabled = True
+        self.pid = os.getpid()
+        self.events = []
+        self._named_threads = set()
+        self._offset = time.time() - perf_counter()
+
+    def disable(self):
+        self.enabled = False
+
+    def span(self, name, cat='', args=None):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def add(self, name, cat, start, end, args=None):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._named_threads:
+            self._named_threads.add(tid)
+            self.events.append({'ph': 'M', 'name': 'thread_name', 'pid': self.pid, 'tid': tid,
+                                'args': {'name': thread.name}})
+        event = {
+            'ph': 'X',
+            'name': name,
+            'cat': cat,
+            'ts': (start + self._offset) * 1e6,
+            'dur': (end - start) * 1e6,
+            'pid': self.pid,
+            'tid': tid,
+        }
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def drain(self):
+        "Hands back everything recorded so far and starts a fresh list."
+        events, self.events = self.events, []
+        return events
+
+    def extend(self, events):
+        self.events.extend(events)
+
+    def write(self, path, process_name='soak-placement'):
+        pids = {event['pid'] for event in self.events}
+        names = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0,
+                  'args': {'name': process_name if pid == self.pid else f'worker {pid}'}}
+                 for pid in sorted(pids)]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': names + self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+tracer = Tracer()
+
+
+def span(name, cat='', args=None):
+    "with span('piece', 'item', {'camp': name}): ... Free when tracing is off."
+    return tracer.span(name, cat, args)
+
+
+# via https://stackoverflow.com/questions/33987060/python-context-manager-that-measures-time
 class timing:
-    def __init__(self, name, debug=False):
+    "Times a block, printing how long it took if debug. It also shows up as a span in --trace output."
+
+    def __init__(self, name, debug=False, cat='stage'):
         self.name = name
         self.debug = debug
+        self.cat = cat
 
     def __enter__(self):
         self.start = perf_counter()
         return self
 
     def __exit__(self, type, value, traceback):
-        self.time = perf_counter() - self.start
+        end = perf_counter()
+        self.time = end - self.start
         self.readout = f'{self.name} took: {self.time:.3f} seconds'
+        if tracer.enabled:
+            tracer.add(self.name, self.cat, self.start, end)
         if self.debug:
             print(self.readout)
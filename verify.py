@@ -0,0 +1,103 @@
+import hashlib
+import os
+from functools import partial
+from typing import List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageChops
+import runner
+
+# Where test.sh keeps known-good renders, and where each build writes the new ones
+GOLDEN_DIRS = [
+    ('images_before', 'images'),
+    ('sign_images_before', 'sign_images'),
+]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+class Verdict(NamedTuple):
+    golden: str
+    output: str
+    ok: bool
+    reason: str
+    pixels: int = 0
+    max_difference: int = 0
+    diff_image: Optional[str] = None
+
+
+def golden_pairs(golden_dir, output_dir) -> List[Tuple[str, str, str]]:
+    """
+    Every image under golden_dir, paired with the same relative path under output_dir,
+    as (golden, output, name). The name is that relative path under the output
+    directory's own name (e.g. sign_images/art/x_sign.jpg), which is where its diff
+    image goes in the diff directory, wherever the two directories are.
+    """
+    pairs = []
+    label = os.path.basename(os.path.normpath(os.path.abspath(output_dir)))
+    for root, _, files in os.walk(golden_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                golden = os.path.join(root, name)
+                relative = os.path.relpath(golden, golden_dir)
+                pairs.append((golden, os.path.join(output_dir, relative), os.path.join(label, relative)))
+    return sorted(pairs)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def difference_mask(golden: Image.Image, output: Image.Image, tolerance: int):
+    """
+    Returns (mask, max difference): the mask is 255 wherever some channel is more
+    than `tolerance` off, like `compare -metric AE -fuzz`.
+    """
+    r, g, b = ImageChops.difference(golden, output).split()
+    worst = ImageChops.lighter(ImageChops.lighter(r, g), b)
+    mask = worst.point(lambda v: 255 if v > tolerance else 0)
+    return mask, worst.getextrema()[1]
+
+
+def diff_image(golden: Image.Image, mask: Image.Image):
+    "The golden image washed out to grey, with every pixel that's off painted red."
+    faded = Image.blend(golden.convert('L').convert('RGB'), Image.new('RGB', golden.size, 'white'), 0.7)
+    faded.paste((255, 0, 0), mask=mask)
+    return faded
+
+
+def compare_pair(tolerance, max_pixels, diff_dir, pair) -> Verdict:
+    golden_path, output_path, name = pair
+    if not os.path.exists(output_path):
+        return Verdict(golden_path, output_path, False, 'missing')
+    # Identical files are identical images, no need to decode anything.
+    if file_sha256(golden_path) == file_sha256(output_path):
+        return Verdict(golden_path, output_path, True, 'identical')
+
+    with Image.open(golden_path) as g, Image.open(output_path) as o:
+        golden, output = g.convert('RGB'), o.convert('RGB')
+    if golden.size != output.size:
+        reason = f'size {output.width}x{output.height}, expected {golden.width}x{golden.height}'
+        return Verdict(golden_path, output_path, False, reason)
+
+    mask, max_difference = difference_mask(golden, output, tolerance)
+    pixels = mask.histogram()[255]
+    if pixels <= max_pixels:
+        return Verdict(golden_path, output_path, True, 'within tolerance', pixels, max_difference)
+
+    diff_path = None
+    if diff_dir:
+        diff_path = os.path.join(diff_dir, os.path.splitext(name)[0] + '.png')
+        os.makedirs(os.path.dirname(diff_path), exist_ok=True)
+        diff_image(golden, mask).save(diff_path)
+    return Verdict(golden_path, output_path, False, f'{pixels} incorrect pixels', pixels, max_difference, diff_path)
+
+
+def verify(pairs, tolerance=0, max_pixels=0, diff_dir=None, jobs=1):
+    """
+    Compares every (golden, output, name) from golden_pairs() and yields a RenderResult per pair whose
+    value is a Verdict. A pixel counts as incorrect if any channel is more than
+    `tolerance` off; a pair passes with up to `max_pixels` of them.
+    """
+    return runner.run(partial(compare_pair, tolerance, max_pixels, diff_dir), pairs, jobs=jobs)
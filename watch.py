@@ -0,0 +1,76 @@
+import os
+import threading
+from typing import Callable, Iterable, Set
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+
+class _ChangeCollector(FileSystemEventHandler):
+    """
+    Collects changed paths until things go quiet for `debounce` seconds.
+
+    Spreadsheet exports and editors often write a file in several steps (or write a
+    temp file and rename it over the original), so we wait for the burst to finish
+    instead of rebuilding on the first event.
+    """
+
+    def __init__(self, interesting: Callable[[str], bool], debounce: float):
+        self.interesting = interesting
+        self.debounce = debounce
+        self.changed: Set[str] = set()
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self._timer = None
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        paths = [os.path.relpath(p) for p in paths if p and self.interesting(os.path.relpath(p))]
+        if not paths:
+            return
+        with self.lock:
+            self.changed.update(paths)
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.ready.set)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def take(self) -> Set[str]:
+        with self.lock:
+            changed, self.changed = self.changed, set()
+            self.ready.clear()
+        return changed
+
+
+def watch(files: Iterable[str], directories: Iterable[str], on_change: Callable[[Set[str]], None], debounce=0.2):
+    """
+    Calls on_change(changed_paths) every time any of `files`, or anything inside
+    `directories`, is saved. Paths are relative to the current directory.
+    Runs until interrupted.
+    """
+    files = {os.path.relpath(f) for f in files}
+    directories = [os.path.relpath(d) for d in directories]
+
+    def interesting(path):
+        return path in files or any(os.path.dirname(path) == d for d in directories)
+
+    collector = _ChangeCollector(interesting, debounce)
+    observer = Observer()
+    for directory in sorted({os.path.dirname(f) or '.' for f in files} | set(directories)):
+        observer.schedule(collector, directory, recursive=False)
+    observer.start()
+    try:
+        while True:
+            # Wake up now and then so Ctrl-C gets noticed
+            if collector.ready.wait(timeout=0.5):
+                changed = collector.take()
+                if changed:
+                    on_change(changed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
@@ -0,0 +1,218 @@
+"""
+Streams rows out of a spreadsheet file as lists of strings, the way csv.reader
+would hand them over for the same sheet exported as CSV. Reads .xlsx (what Google
+Sheets' File > Download > Microsoft Excel gives you) and .ods, with nothing but
+zipfile and the standard library's XML parser.
+
+Sheets are parsed a row at a time and each row is thrown away once it's been
+handed over, so the whole workbook is never in memory.
+"""
+import posixpath
+import re
+import zipfile
+from typing import Iterator, List, Tuple
+from xml.etree.ElementTree import iterparse
+
+XLSX_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+XLSX_DOC_RELS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+XLSX_PACKAGE_RELS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+ODS_TABLE = '{urn:oasis:names:tc:opendocument:xmlns:table:1.0}'
+ODS_TEXT = '{urn:oasis:names:tc:opendocument:xmlns:text:1.0}'
+
+EXTENSIONS = ('.xlsx', '.ods')
+
+Rows = Iterator[List[str]]
+
+
+class WorkbookError(ValueError):
+    pass
+
+
+def is_workbook(path) -> bool:
+    return isinstance(path, str) and path.lower().endswith(EXTENSIONS)
+
+
+def _stream(source, tag, ancestor_tags=()) -> Iterator:
+    """
+    Every finished `tag` element in the XML, removed from its parent once the caller
+    is done with it so the tree never grows, as ('end', element). Elements in
+    `ancestor_tags` are handed over as ('start', element) when they start, for the
+    caller to notice (e.g. a new table).
+    """
+    stack = []
+    for event, element in iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element)
+            if element.tag in ancestor_tags:
+                yield 'start', element
+            continue
+        stack.pop()
+        if element.tag == tag:
+            yield 'end', element
+            if stack:
+                stack[-1].remove(element)
+
+
+# --- xlsx
+
+def _column_index(reference: str) -> int:
+    "'B7' -> 1"
+    index = 0
+    for letter in re.match(r'[A-Z]+', reference).group(0):
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _xlsx_text(element) -> str:
+    "The text of an <si> or <is>: plain <t>, or the <t> of every rich text run (but not phonetic hints)."
+    phonetic = {id(t) for rph in element.iter(f'{XLSX_MAIN}rPh') for t in rph.iter(f'{XLSX_MAIN}t')}
+    return ''.join(t.text or '' for t in element.iter(f'{XLSX_MAIN}t') if id(t) not in phonetic)
+
+
+def _xlsx_shared_strings(archive) -> List[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    with archive.open('xl/sharedStrings.xml') as f:
+        return [_xlsx_text(si) for _, si in _stream(f, f'{XLSX_MAIN}si')]
+
+
+def _xlsx_sheet_parts(archive) -> List[Tuple[str, str]]:
+    "(sheet name, part in the zip) for every sheet, in the workbook's tab order."
+    with archive.open('xl/_rels/workbook.xml.rels') as f:
+        targets = {rel.get('Id'): rel.get('Target') for _, rel in _stream(f, f'{XLSX_PACKAGE_RELS}Relationship')}
+    with archive.open('xl/workbook.xml') as f:
+        sheets = [(sheet.get('name'), targets[sheet.get(f'{XLSX_DOC_RELS}id')])
+                  for _, sheet in _stream(f, f'{XLSX_MAIN}sheet')]
+    # Targets are relative to xl/, though some writers make them absolute
+    return [(name, target.lstrip('/') if target.startswith('/') else posixpath.normpath(f'xl/{target}'))
+            for name, target in sheets]
+
+
+def _xlsx_cell(cell, shared_strings) -> str:
+    kind = cell.get('t', 'n')
+    if kind == 'inlineStr':
+        inline = cell.find(f'{XLSX_MAIN}is')
+        return _xlsx_text(inline) if inline is not None else ''
+    value = cell.findtext(f'{XLSX_MAIN}v')
+    if value is None:
+        return ''
+    if kind == 's':
+        return shared_strings[int(value)]
+    if kind == 'b':
+        # What Google Sheets puts in a CSV for a checkbox
+        return 'TRUE' if value == '1' else 'FALSE'
+    if kind == 'n' and value.endswith('.0'):
+        return value[:-2]
+    return value
+
+
+def _xlsx_rows(archive, part, shared_strings) -> Rows:
+    with archive.open(part) as f:
+        for _, row in _stream(f, f'{XLSX_MAIN}row'):
+            values = []
+            for cell in row.iter(f'{XLSX_MAIN}c'):
+                reference = cell.get('r')
+                if reference:
+                    # Empty cells are usually left out altogether
+                    values.extend([''] * (_column_index(reference) - len(values)))
+                values.append(_xlsx_cell(cell, shared_strings))
+            yield values
+
+
+def xlsx_sheets(path) -> Iterator[Tuple[str, Rows]]:
+    with zipfile.ZipFile(path) as archive:
+        shared_strings = _xlsx_shared_strings(archive)
+        for name, part in _xlsx_sheet_parts(archive):
+            yield name, _xlsx_rows(archive, part, shared_strings)
+
+
+# --- ods
+
+def _ods_inline(element, parts):
+    "Appends the text inside `element` (but not its tail) to parts."
+    if element.tag == f'{ODS_TEXT}s':
+        parts.append(' ' * int(element.get(f'{ODS_TEXT}c', 1)))
+    elif element.tag == f'{ODS_TEXT}tab':
+        parts.append('\t')
+    elif element.tag == f'{ODS_TEXT}line-break':
+        parts.append('\n')
+    parts.append(element.text or '')
+    for child in element:
+        _ods_inline(child, parts)
+        parts.append(child.tail or '')
+
+
+def _ods_text(cell) -> str:
+    "A cell's text as shown: its paragraphs a line each, with <text:s/> runs of spaces put back."
+    paragraphs = []
+    for p in cell.iter(f'{ODS_TEXT}p'):
+        parts = []
+        _ods_inline(p, parts)
+        paragraphs.append(''.join(parts))
+    return '\n'.join(paragraphs)
+
+
+def _ods_row(row) -> List[str]:
+    values = []
+    blanks = 0
+    for cell in row:
+        if cell.tag not in (f'{ODS_TABLE}table-cell', f'{ODS_TABLE}covered-table-cell'):
+            continue
+        repeat = int(cell.get(f'{ODS_TABLE}number-columns-repeated', 1))
+        text = _ods_text(cell)
+        if not text:
+            # Rows end in a cell repeated to the edge of the sheet, only keep blanks that something follows
+            blanks += repeat
+            continue
+        values.extend([''] * blanks)
+        blanks = 0
+        values.extend([text] * repeat)
+    return values
+
+
+def ods_sheets(path) -> Iterator[Tuple[str, Rows]]:
+    """
+    Every table in the file. They're all in content.xml, so this is one parse: a
+    sheet's rows have to be taken (or skipped) before asking for the next sheet.
+    """
+    with zipfile.ZipFile(path) as archive, archive.open('content.xml') as f:
+        events = _stream(f, f'{ODS_TABLE}table-row', ancestor_tags=(f'{ODS_TABLE}table',))
+        pending = None
+
+        def rows():
+            nonlocal pending
+            for event, element in events:
+                if event == 'start':
+                    pending = element
+                    return
+                values = _ods_row(element)
+                # Blank rows get repeated to the bottom of the sheet too, once is plenty
+                repeat = int(element.get(f'{ODS_TABLE}number-rows-repeated', 1)) if values else 1
+                for _ in range(repeat):
+                    yield values
+
+        for event, element in events:
+            if event == 'start':
+                pending = element
+                break
+        while pending is not None:
+            table, pending = pending, None
+            sheet_rows = rows()
+            yield table.get(f'{ODS_TABLE}name'), sheet_rows
+            # Whatever the caller didn't read of this sheet, skip to the next one
+            for _ in sheet_rows:
+                pass
+
+
+def sheets(path) -> Iterator[Tuple[str, Rows]]:
+    "(sheet name, rows) for every sheet in the workbook at `path`, in tab order."
+    lowered = path.lower()
+    try:
+        if lowered.endswith('.xlsx'):
+            yield from xlsx_sheets(path)
+        elif lowered.endswith('.ods'):
+            yield from ods_sheets(path)
+        else:
+            raise WorkbookError(f'{path} is not a workbook, expected one of {", ".join(EXTENSIONS)}')
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise WorkbookError(f'Could not read {path}: {e}') from e
@@ -0,0 +1,134 @@
+import os
+import threading
+from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import NamedTuple
+from timing import span
+
+
+class OutputFormat(NamedTuple):
+    name: str
+    extension: str
+    save_options: dict
+
+
+def output_format(name='jpeg', quality=100) -> OutputFormat:
+    """
+    jpeg: what we've always made. quality=100 with no chroma subsampling for print runs,
+          drop the quality for previews.
+    png:  lossless, optimized. Slow to encode, good for flat artwork.
+    webp: lossless WebP. Usually the smallest lossless option.
+    """
+    if name == 'jpeg':
+        return OutputFormat('jpeg', 'jpg', {'format': 'JPEG', 'subsampling': 0, 'quality': quality})
+    if name == 'png':
+        return OutputFormat('png', 'png', {'format': 'PNG', 'optimize': True})
+    if name == 'webp':
+        return OutputFormat('webp', 'webp', {'format': 'WEBP', 'lossless': True})
+    if name == 'svg':
+        # Not an image format Pillow writes: what gets written is the document text (see svgbackend)
+        return OutputFormat('svg', 'svg', {})
+    raise ValueError(f'Unknown output format {name!r}')
+
+
+FORMAT_NAMES = ['jpeg', 'png', 'webp']
+
+
+class Written(NamedTuple):
+    filename: str
+    bytes: int
+
+
+class ImageWriter(object):
+    """
+    Encodes and writes images on a small thread pool so the next item can render
+    while this one is being compressed (Pillow releases the GIL while encoding).
+
+    At most `max_pending` images are queued at once; submit() blocks past that so
+    finished-but-unwritten images can't pile up in memory.
+    """
+
+    def __init__(self, fmt: OutputFormat = None, threads=2, max_pending=None):
+        self.format = fmt or output_format()
+        self.threads = threads
+        self._pending = threading.BoundedSemaphore(max_pending or threads * 2)
+        self._executor = None
+
+    def filename(self, thing, directory, suffix=''):
+        return thing.to_filename(directory, suffix=suffix, extension=self.format.extension)
+
+    def write(self, img, filename) -> Written:
+        "Encodes and writes right now, on the calling thread."
+        with span('encode', 'write', {'file': filename, 'format': self.format.name}):
+            if isinstance(img, str):
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write(img)
+            else:
+                img.save(filename, **self.format.save_options)
+        return Written(filename, os.path.getsize(filename))
+
+    def encode(self, img) -> bytes:
+        "The bytes write() would put in the file, for when there's no file (e.g. the render service)."
+        if isinstance(img, str):
+            return img.encode('utf-8')
+        out = BytesIO()
+        with span('encode', 'write', {'format': self.format.name}):
+            img.save(out, **self.format.save_options)
+        return out.getvalue()
+
+    def submit(self, img, filename) -> Future:
+        "Queues img to be written. The future resolves to a Written."
+        if self.threads <= 0:
+            future = Future()
+            future.set_result(self.write(img, filename))
+            return future
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='writer')
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self.write, img, filename)
+        except BaseException:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda _: self._pending.release())
+        return future
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def combine(futures) -> Future:
+    "One future for several writes of the same item: the first one's filename, everyone's bytes."
+    if len(futures) == 1:
+        return futures[0]
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        try:
+            written = [future.result() for future in futures]
+        except Exception as e:
+            combined.set_exception(e)
+            return
+        combined.set_result(Written(written[0].filename, sum(w.bytes for w in written)))
+
+    for future in futures:
+        future.add_done_callback(finished)
+    return combined
+
+
+image_writer = ImageWriter()
+
+
+def configure(fmt: OutputFormat, threads=2):
+    global image_writer
+    image_writer.close()
+    image_writer = ImageWriter(fmt, threads)
+    return image_writer